@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Compare TelnetServer connection accept rate and input throughput on each
+available event loop: the standard library 'asyncio', the bundled 'tulip'
+fallback, and the asyncio-compatible 'uvloop', if installed.
+
+Clients are plain blocking sockets driven by a thread, so only the server
+end of each measurement runs on the event loop under test.
+"""
+import threading
+import argparse
+import logging
+import socket
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'telnetlib3'))
+
+import server
+
+ARGS = argparse.ArgumentParser(description="Benchmark event loops.")
+ARGS.add_argument(
+    '--loops', action="store", dest='loops',
+    default='asyncio,tulip,uvloop', help='Event loops to compare')
+ARGS.add_argument(
+    '--connections', action="store", dest='connections',
+    default=500, type=int, help='Number of connections for accept rate')
+ARGS.add_argument(
+    '--kbytes', action="store", dest='kbytes',
+    default=256, type=int, help='Kilobytes of input for throughput')
+
+
+class BenchServer(server.TelnetServer):
+    """ TelnetServer that stops the event loop once ``counter`` reaches
+        the target values of connections made or bytes received.
+    """
+    counter = None
+
+    def connection_made(self, transport):
+        server.TelnetServer.connection_made(self, transport)
+        self.counter['connections'] += 1
+        self._check_done()
+
+    def data_received(self, data):
+        server.TelnetServer.data_received(self, data)
+        self.counter['bytes'] += len(data)
+        self._check_done()
+
+    def _check_done(self):
+        counter = self.counter
+        if not counter['stopped'] and (
+                counter['connections'] >= counter['want_connections']
+                and counter['bytes'] >= counter['want_bytes']):
+            counter['stopped'] = True
+            self._loop.stop()
+
+
+def _drain(sock):
+    """ Discard all output sent by server to ``sock`` until closed. """
+    try:
+        while sock.recv(65536):
+            pass
+    except socket.error:
+        pass
+
+
+def _run_clients(addr, num_conns, payload, done):
+    """ Connect ``num_conns`` sockets to ``addr``, the first of which
+        sends ``payload``, and hold all of them open until ``done`` is set.
+    """
+    socks, readers = [], []
+    for num in range(num_conns):
+        sock = socket.create_connection(addr)
+        socks.append(sock)
+        reader = threading.Thread(target=_drain, args=(sock,), daemon=True)
+        reader.start()
+        readers.append(reader)
+    if payload:
+        socks[0].sendall(payload)
+    done.wait()
+    for sock in socks:
+        sock.close()
+
+
+def bench(loop_name, num_conns, payload):
+    """ Returns tuple (accept rate, bytes per second) for ``loop_name``. """
+    loop = server.new_event_loop(loop_name)
+    server.asyncio.set_event_loop(loop)
+    counter = dict()
+    protocol = type('BenchServer', (BenchServer,), {'counter': counter})
+    sockets = server.start_server(
+            loop, lambda: protocol(loop=loop), '127.0.0.1', 0)
+    addr = sockets[0].getsockname()
+    results = []
+    for want_conns, want_bytes in ((num_conns, 0), (1, len(payload))):
+        counter.update(connections=0, bytes=0, stopped=False,
+                       want_connections=want_conns, want_bytes=want_bytes)
+        done = threading.Event()
+        clients = threading.Thread(target=_run_clients, args=(
+            addr, want_conns, payload if want_bytes else b'', done))
+        start = time.time()
+        clients.start()
+        loop.run_forever()
+        duration = time.time() - start
+        done.set()
+        clients.join()
+        results.append((want_conns if not want_bytes else want_bytes)
+                       / max(duration, 1e-9))
+    return tuple(results)
+
+
+def main():
+    args = ARGS.parse_args()
+    logging.getLogger().setLevel(logging.WARN)
+    line = b'x' * 78 + b'\r\n'
+    payload = line * (args.kbytes * 1024 // len(line))
+    print('{:<10} {:>16} {:>16}'.format('loop', 'accepts/s', 'input KB/s'))
+    for loop_name in args.loops.split(','):
+        try:
+            accept_rate, throughput = bench(
+                    loop_name, args.connections, payload)
+        except (ImportError, SyntaxError) as err:
+            # the bundled tulip does not compile on python 3.7 and later.
+            print('{:<10} unavailable: {}'.format(loop_name, err))
+            continue
+        print('{:<10} {:>16.1f} {:>16.1f}'.format(
+            loop_name, accept_rate, throughput / 1024))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Report memory allocated for each idle TelnetServer session, measured with
+tracemalloc for several numbers of concurrent sessions.
+
+Sessions are connected to a transport that discards all output, and are
+idle once negotiation completes and the first prompt is displayed.
+"""
+import tracemalloc
+import argparse
+import logging
+import sys
+import os
+import gc
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'telnetlib3'))
+
+import server
+
+ARGS = argparse.ArgumentParser(description="Benchmark session memory.")
+ARGS.add_argument(
+    '--sessions', action="store", dest='sessions',
+    default='10000,100000', help='Numbers of sessions to measure')
+
+
+class NullTransport(object):
+    """ Transport that discards all output. """
+    def __init__(self, port):
+        self._extra = {'peername': ('127.0.0.1', port)}
+
+    def get_extra_info(self, name, default=None):
+        return self._extra.get(name, default)
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class IdleServer(server.TelnetServer):
+    """ TelnetServer that does not wait for replies to negotiation. """
+    __slots__ = ()
+    CONNECT_MINWAIT = 0
+    CONNECT_MAXWAIT = 0
+
+
+def measure(num_sessions):
+    """ Returns bytes allocated for each of ``num_sessions`` idle sessions.
+    """
+    loop = server.new_event_loop()
+    server.asyncio.set_event_loop(loop)
+    transports = [NullTransport(port) for port in range(num_sessions)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = []
+    for transport in transports:
+        session = IdleServer(loop=loop)
+        session.connection_made(transport)
+        sessions.append(session)
+    # run negotiation to completion, and display of first prompt.
+    for _ in range(3):
+        loop.run_until_complete(server.asyncio.sleep(0))
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in
+                after.compare_to(before, 'filename'))
+    # exclude the list holding each session
+    total -= sys.getsizeof(sessions)
+    loop.close()
+    return total / num_sessions
+
+
+def main():
+    args = ARGS.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+    print('{:>10} {:>16}'.format('sessions', 'bytes/session'))
+    for num_sessions in (int(num) for num in args.sessions.split(',')):
+        print('{:>10} {:>16.1f}'.format(num_sessions, measure(num_sessions)))
+
+if __name__ == '__main__':
+    main()
@@ -85,7 +85,6 @@ class MTTS(object):
 
 class MudTelnetServer(LinemodeTelnetServer):
     _ttype_level = 1
-    _start_1mb = None
     def __init__(self, log=logging, debug=False):
         LinemodeTelnetServer.__init__(self, log, debug)
 
@@ -152,15 +151,10 @@ class MudTelnetServer(LinemodeTelnetServer):
             LinemodeTelnetServer.process_cmd(self, cmd)
 
     def test_1mb(self):
-        #self.stream.write(b'x' * 1024 * 1024)
-        if self._start_1mb is None:
-            self._start_1mb = self.stream.byte_count
-        loop = tulip.get_event_loop()
-        self.stream.write(b'\r\n' + (b'x' * self.width))
-        if self.stream.byte_count - self._start_1mb < (1024): #*1024):
-            loop.call_soon(self.test_1mb)
-        else:
-            self._start_1mb = None
+        # lines are pulled as the transport drains, rather than rescheduled
+        # by loop.call_soon() until 1MB is written.
+        line = b'\r\n' + (b'x' * self.width)
+        self.send_stream(line for _ in range(1024 * 1024 // len(line)))
         #wait_min = time.time() - self.connect_time <= self.CONNECT_MINWAIT
         #wait_max = time.time() - self.connect_time <= self.CONNECT_MAXWAIT
         #if wait_min or any(self.stream.pending_option.values()) and wait_max:
@@ -1,9 +1,8 @@
 """
 Telnet Protocol using the 'tulip' project of PEP 3156.
 
-Requires Python 3.3.
-
-For convenience, the 'tulip' module is included.
+Requires Python 3.3. The standard library 'asyncio' module is used when
+available, otherwise the included 'tulip' module is used as a fallback.
 
 See the ``README`` file for details and license.
 """
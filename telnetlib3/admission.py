@@ -0,0 +1,123 @@
+import collections
+import time
+
+__all__ = ['AdmissionControl', 'ADMIT', 'DEFER', 'REJECT']
+
+#: verdicts returned by ``AdmissionControl.admit()``
+(ADMIT, DEFER, REJECT) = ('admit', 'defer', 'reject')
+
+
+class AdmissionControl(object):
+    """
+        Limits the rate at which new telnet sessions are admitted, so that a
+        reconnect stampede does not delay the time-to-prompt of existing
+        sessions. A single instance is shared by all sessions of a server.
+
+        Sessions are "negotiating" from admission until ``negotiated()``
+        is called, when the session displays its first prompt. When
+        ``max_negotiating`` sessions are negotiating, the loop is considered
+        saturated, and further sessions are deferred (when ``defer`` is
+        True) for up to ``max_defer`` seconds, or rejected.
+
+        Each remote address may be limited to ``max_per_ip`` concurrent
+        sessions, and to a rate of ``rate_per_ip`` new sessions per second,
+        allowing bursts of up to ``burst_per_ip``. Both are tracked in
+        dictionaries keyed by address, for O(1) lookup, and the rate table
+        is bounded to the ``max_tracked`` most recently seen addresses.
+
+        A value of ``None`` disables any limit.
+    """
+    #: seconds between attempts to admit a deferred session
+    DEFER_INTERVAL = 0.10
+
+    def __init__(self, max_negotiating=None, max_per_ip=None,
+                 rate_per_ip=None, burst_per_ip=None, defer=True,
+                 max_defer=10.0, max_tracked=65536):
+        self.max_negotiating = max_negotiating
+        self.max_per_ip = max_per_ip
+        self.rate_per_ip = rate_per_ip
+        self.burst_per_ip = (burst_per_ip if burst_per_ip is not None
+                             else max(1, rate_per_ip or 1))
+        self.defer = defer
+        self.max_defer = max_defer
+        self.max_tracked = max_tracked
+        #: number of admitted sessions still negotiating
+        self.negotiating = 0
+        #: count of verdicts returned by ``admit()``, keyed by verdict
+        self.stats = collections.Counter()
+        #: number of admitted sessions, keyed by remote address
+        self._sessions = collections.Counter()
+        #: token bucket [tokens, timestamp], keyed by remote address
+        self._buckets = collections.OrderedDict()
+
+    def admit(self, addr, waited=0.0):
+        """ .. method::admit(addr : str, waited : float) -> str
+
+            Returns verdict ``ADMIT``, ``DEFER``, or ``REJECT`` for a new
+            session from remote address ``addr``. ``waited`` is the number
+            of seconds the session has already been deferred; the per-ip
+            rate is only charged on the first attempt.
+        """
+        verdict = self._verdict(addr, waited)
+        if verdict == ADMIT:
+            self._sessions[addr] += 1
+            self.negotiating += 1
+        self.stats[verdict] += 1
+        return verdict
+
+    def negotiated(self):
+        """ An admitted session completed negotiation. """
+        self.negotiating = max(0, self.negotiating - 1)
+
+    def release(self, addr, negotiating=False):
+        """ Session from ``addr`` disconnected, ``negotiating`` is True
+            if it disconnected before ``negotiated()`` was called.
+        """
+        if negotiating:
+            self.negotiated()
+        if self._sessions.get(addr, 0) <= 1:
+            self._sessions.pop(addr, None)
+        else:
+            self._sessions[addr] -= 1
+
+    def _verdict(self, addr, waited):
+        if not waited and not self._take_token(addr):
+            return REJECT
+        if (self.max_per_ip is not None
+                and self._sessions.get(addr, 0) >= self.max_per_ip):
+            return REJECT
+        if (self.max_negotiating is not None
+                and self.negotiating >= self.max_negotiating):
+            if self.defer and waited < self.max_defer:
+                return DEFER
+            return REJECT
+        return ADMIT
+
+    def _take_token(self, addr):
+        """ Returns True if the token bucket of ``addr`` permits another
+            session, charging one token.
+        """
+        if self.rate_per_ip is None:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.get(addr)
+        if bucket is None:
+            bucket = self._buckets[addr] = [self.burst_per_ip, now]
+            if len(self._buckets) > self.max_tracked:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(addr)
+            bucket[0] = min(self.burst_per_ip,
+                            bucket[0] + (now - bucket[1]) * self.rate_per_ip)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def __str__(self):
+        """ Returns string describing current admission state. """
+        return '{} negotiating, {} addresses, {}'.format(
+            self.negotiating, len(self._sessions), ', '.join(
+                '{} {}'.format(num, verdict)
+                for verdict, num in sorted(self.stats.items())) or 'idle')
@@ -0,0 +1,116 @@
+import collections
+import codecs
+
+__all__ = ['CodecCache', 'CODECS']
+
+
+class CodecCache(object):
+    """
+        Lookup of codecs by the charset names negotiated by CHARSET, rfc 2066,
+        or set as ``default_encoding``. A single instance, ``CODECS``, is
+        shared by all sessions of the process, so that thousands of sessions
+        negotiating 'UTF-8' share a single ``codecs.CodecInfo``, and its
+        incremental decoder factory, rather than each calling
+        ``codecs.lookup()``, or falling back through ``LookupError``.
+
+        Charset names are case-insensitive. Names that are unknown to python
+        are also kept, as None, in an ``collections.OrderedDict`` of the
+        ``maxsize`` most recently used names, so that a client repeatedly
+        offering an unsupported charset costs only a dictionary lookup.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        #: count of ``lookup()`` results, keyed by 'hit', 'miss', or
+        #  'unknown', a miss of a charset unknown to python.
+        self.stats = collections.Counter()
+        #: tuple (codecs.CodecInfo, ascii_compatible), keyed by lowercase
+        #  charset name, or None when name is unknown.
+        self._cache = collections.OrderedDict()
+
+    def lookup(self, name):
+        """ .. method::lookup(name : str) -> codecs.CodecInfo
+
+            Returns codec of charset ``name``, or None if unknown.
+        """
+        item = self._item(name)
+        return item[0] if item is not None else None
+
+    def incrementaldecoder(self, name):
+        """ .. method::incrementaldecoder(name : str) -> type
+
+            Returns incremental decoder factory of charset ``name``,
+            raising ``LookupError`` if unknown.
+        """
+        item = self._item(name)
+        if item is None:
+            raise LookupError('unknown encoding: {}'.format(name))
+        return item[0].incrementaldecoder
+
+    def ascii_compatible(self, name):
+        """ .. method::ascii_compatible(name : str) -> bool
+
+            Returns True if 7-bit ascii is encoded and decoded as-is by
+            charset ``name``, as by utf-8 and latin-1, but not utf-16.
+        """
+        item = self._item(name)
+        return item[1] if item is not None else False
+
+    def select(self, names):
+        """ .. method::select(names : list) -> str
+
+            Returns first of charset ``names`` known, or None.
+        """
+        for name in names:
+            if self._item(name) is not None:
+                return name
+        return None
+
+    def _item(self, name):
+        key = name.lower()
+        try:
+            item = self._cache[key]
+        except KeyError:
+            pass
+        else:
+            self._cache.move_to_end(key)
+            self.stats['hit'] += 1
+            return item
+        try:
+            info = codecs.lookup(key)
+        except LookupError:
+            info = None
+        if info is None or not getattr(info, '_is_text_encoding', True):
+            # unknown, or not a text encoding, such as 'base64' or 'rot13'
+            item = None
+            self.stats['unknown'] += 1
+        else:
+            item = (info, _ascii_compatible(info))
+            self.stats['miss'] += 1
+        self._cache[key] = item
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return item
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __str__(self):
+        """ Returns string describing current cache state. """
+        return '{} charsets, {} hit, {} miss, {} unknown'.format(
+            len(self._cache), self.stats['hit'], self.stats['miss'],
+            self.stats['unknown'])
+
+
+def _ascii_compatible(info):
+    """ Returns True if 7-bit ascii is encoded and decoded as-is by codec
+        ``info``.
+    """
+    ascii = bytes(range(128))
+    try:
+        return (info.decode(ascii)[0] == ascii.decode('ascii')
+                and info.encode(ascii.decode('ascii'))[0] == ascii)
+    except UnicodeError:
+        return False
+
+#: codecs of all sessions of this process
+CODECS = CodecCache()
@@ -0,0 +1,110 @@
+import concurrent.futures
+import collections
+import time
+
+try:
+    import asyncio
+except ImportError:
+    import tulip as asyncio
+
+__all__ = ['CommandExecutor', 'INLINE', 'THREAD', 'PROCESS']
+
+#: kinds of ``CommandExecutor``
+(INLINE, THREAD, PROCESS) = ('inline', 'thread', 'process')
+
+
+class CommandExecutor(object):
+    """
+        Runs blocking command handlers outside of the event loop, so that
+        a slow command of one session does not stall every other session.
+        A single instance of each kind is shared by all sessions of a
+        server.
+
+        ``kind`` is one of ``INLINE``, called directly on the event loop,
+        ``THREAD``, run by a ``concurrent.futures.ThreadPoolExecutor``, for
+        commands that block on i/o, such as dns lookups, disk or database
+        reads, or ``PROCESS``, run by a ``ProcessPoolExecutor`` for cpu-heavy
+        commands, whose function and arguments must be picklable. Each pool
+        has up to ``max_workers`` workers.
+
+        The number of commands submitted and not yet completed, ``pending``,
+        and the latency of each, from submission to completion, are tracked.
+    """
+    def __init__(self, kind=THREAD, max_workers=None):
+        assert kind in (INLINE, THREAD, PROCESS), kind
+        self.kind = kind
+        self.max_workers = max_workers
+        #: number of commands submitted and not yet completed
+        self.pending = 0
+        #: greatest value of ``pending``
+        self.max_pending = 0
+        #: count of commands by outcome, 'completed', 'failed', 'cancelled'
+        self.stats = collections.Counter()
+        #: total and greatest latency of completed commands, in seconds
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        #: ``concurrent.futures.Executor``, created on first use
+        self._pool = None
+
+    def submit(self, loop, func, *args):
+        """ .. method::submit(loop, func : callable, *args) -> Future
+
+            Returns future of result of ``func(*args)``, run by executor
+            and completed on event loop ``loop``.
+        """
+        submitted = time.monotonic()
+        if self.kind == INLINE:
+            future = (loop.create_future() if hasattr(loop, 'create_future')
+                      else asyncio.Future(loop=loop))
+            try:
+                future.set_result(func(*args))
+            except Exception as err:
+                future.set_exception(err)
+        else:
+            future = loop.run_in_executor(self._executor(), func, *args)
+        self.pending += 1
+        self.max_pending = max(self.pending, self.max_pending)
+        future.add_done_callback(lambda fut: self._done(fut, submitted))
+        return future
+
+    def _executor(self):
+        if self._pool is None:
+            if self.kind == THREAD:
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                        self.max_workers)
+            else:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                        self.max_workers)
+        return self._pool
+
+    def _done(self, future, submitted):
+        """ Update metrics for ``future`` completed, ``submitted`` at. """
+        self.pending -= 1
+        if future.cancelled():
+            self.stats['cancelled'] += 1
+            return
+        latency = time.monotonic() - submitted
+        self.latency_total += latency
+        self.latency_max = max(latency, self.latency_max)
+        self.stats['failed' if future.exception() else 'completed'] += 1
+
+    @property
+    def latency_mean(self):
+        """ Mean latency of completed and failed commands, in seconds. """
+        num = self.stats['completed'] + self.stats['failed']
+        return self.latency_total / num if num else 0.0
+
+    def shutdown(self, wait=True):
+        """ Shutdown pool of workers, if any. """
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def __str__(self):
+        """ Returns string describing executor metrics. """
+        return ('{} executor: {} pending (max {}), {} completed, {} failed, '
+                '{} cancelled, latency {:0.3f}s mean, {:0.3f}s max'.format(
+                    self.kind, self.pending, self.max_pending,
+                    self.stats['completed'], self.stats['failed'],
+                    self.stats['cancelled'], self.latency_mean,
+                    self.latency_max))
@@ -0,0 +1,136 @@
+import collections
+import logging
+import json
+import time
+import os
+
+__all__ = ['FingerprintCache']
+
+
+class FingerprintCache(object):
+    """
+        Remembers the outcome of negotiation for each kind of telnet client,
+        so that a client reconnecting with the same fingerprint is not asked
+        again for what it has already answered. A single instance is shared
+        by all sessions of a server.
+
+        A fingerprint is a string describing the ordered replies to the
+        options offered on-connect, and the first TTYPE received. It is
+        valued by a dictionary of the outcome of each advanced option,
+        'accepted', 'refused' or 'unanswered', keyed by command and option
+        name, and the environment values learned by TTYPE cycling.
+
+        Fingerprints are kept in an ``collections.OrderedDict`` of the
+        ``maxsize`` most recently used, each expiring ``ttl`` seconds after
+        it was stored. When ``filename`` is set, the cache is loaded from,
+        and saved to, that file as JSON, at most every ``save_interval``
+        seconds, and by ``save()``.
+    """
+    #: outcomes of advanced options
+    (ACCEPTED, REFUSED, UNANSWERED) = ('accepted', 'refused', 'unanswered')
+
+    def __init__(self, maxsize=4096, ttl=7 * 24 * 60 * 60, filename=None,
+                 save_interval=60.0, log=logging):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.filename = filename
+        self.save_interval = save_interval
+        self.log = log
+        #: count of ``get()`` results, keyed by 'hit' or 'miss'
+        self.stats = collections.Counter()
+        #: tuple (timestamp, record), keyed by fingerprint
+        self._cache = collections.OrderedDict()
+        #: True when stored since last ``save()``
+        self._dirty = False
+        #: time of last ``save()``
+        self._saved = time.monotonic()
+        if filename is not None:
+            self.load()
+
+    def get(self, fingerprint):
+        """ .. method::get(fingerprint : str) -> dict
+
+            Returns record stored for ``fingerprint``, or None if unknown
+            or expired.
+        """
+        item = self._cache.get(fingerprint)
+        if item is not None and time.time() - item[0] > self.ttl:
+            del self._cache[fingerprint]
+            item = None
+        if item is None:
+            self.stats['miss'] += 1
+            return None
+        self._cache.move_to_end(fingerprint)
+        self.stats['hit'] += 1
+        return item[1]
+
+    def store(self, fingerprint, record):
+        """ .. method::store(fingerprint : str, record : dict)
+
+            Store ``record`` for ``fingerprint``, saving to ``filename``,
+            if set, when ``save_interval`` has elapsed since last saved.
+        """
+        self._cache[fingerprint] = (time.time(), record)
+        self._cache.move_to_end(fingerprint)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        self._dirty = True
+        if (self.filename is not None
+                and time.monotonic() - self._saved > self.save_interval):
+            self.save()
+
+    def load(self):
+        """ Load unexpired fingerprints from ``filename``, if it exists. """
+        try:
+            with open(self.filename, 'r') as fin:
+                items = json.load(fin)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            self.log.warn('fingerprints not loaded from {}: {}'.format(
+                self.filename, err))
+            return
+        now = time.time()
+        try:
+            if not isinstance(items, list):
+                raise ValueError('expected list, got {}'.format(
+                    type(items).__name__))
+            for fingerprint, stored, record in items[-self.maxsize:]:
+                if not isinstance(record, dict):
+                    raise ValueError('record of {!r} is not a dict'.format(
+                        fingerprint))
+                if now - stored <= self.ttl:
+                    self._cache[fingerprint] = (stored, record)
+        except (TypeError, ValueError) as err:
+            self._cache.clear()
+            self.log.warn('fingerprints not loaded from {}: {}'.format(
+                self.filename, err))
+            return
+        self.log.debug('loaded {} fingerprints from {}'.format(
+            len(self._cache), self.filename))
+
+    def save(self):
+        """ Save fingerprints to ``filename``, if any were stored. """
+        self._saved = time.monotonic()
+        if self.filename is None or not self._dirty:
+            return
+        items = [(fingerprint, stored, record) for fingerprint, (
+            stored, record) in self._cache.items()]
+        tmp_filename = '{}.tmp'.format(self.filename)
+        try:
+            with open(tmp_filename, 'w') as fout:
+                json.dump(items, fout)
+            os.replace(tmp_filename, self.filename)
+        except OSError as err:
+            self.log.warn('fingerprints not saved to {}: {}'.format(
+                self.filename, err))
+            return
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __str__(self):
+        """ Returns string describing current cache state. """
+        return '{} fingerprints, {} hit, {} miss'.format(
+            len(self._cache), self.stats['hit'], self.stats['miss'])
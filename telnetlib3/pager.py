@@ -0,0 +1,86 @@
+import re
+
+from widths import _ASCII, char_width
+
+__all__ = ['Pager']
+
+#: an escape sequence of ``TelnetServer.standout()`` and others, which
+#  occupies no column of the terminal.
+_ESCAPE = re.compile(r'\x1b\[[0-9;?]*[@-~]')
+
+
+class Pager(object):
+    """
+        Paginates output of a session by its window size, negotiated by
+        NAWS, rfc 1073, to be displayed a page at a time, as by more(1).
+
+        Lines are pulled from iterator ``lines`` only as their rows are
+        displayed, and wrapped at ``width`` columns, so that paging a
+        listing of any length holds only the remainder of the line being
+        displayed. Columns are counted by ``widths.char_width()``: a wide
+        character is not split by wrapping, and escape sequences are not
+        counted, nor split. Rows not yet displayed are re-flowed by
+        ``resize()``.
+    """
+    __slots__ = ('width', 'height', 'shown', '_lines', '_partial')
+
+    def __init__(self, lines, width=80, height=24):
+        self.width = width
+        self.height = height
+        #: count of rows displayed
+        self.shown = 0
+        #: iterator of lines, or None when exhausted
+        self._lines = lines
+        #: remainder of line being displayed, or None
+        self._partial = None
+
+    def resize(self, width, height):
+        """ .. method::resize(width : int, height : int)
+
+            Set window size of rows not yet displayed.
+        """
+        self.width, self.height = width, height
+
+    @property
+    def done(self):
+        """ True if all lines have been displayed. """
+        if self._partial is None and self._lines is not None:
+            self._partial = next(self._lines, None)
+            if self._partial is None:
+                self._lines = None
+        return self._partial is None
+
+    def rows(self, count=None):
+        """ .. method::rows(count=None) -> list
+
+            Returns next ``count`` rows to display, by default a page,
+            the window height less one row, for the prompt of the pager.
+        """
+        count = count or max(1, self.height - 1)
+        rows = []
+        while len(rows) < count and not self.done:
+            row, rest = _split(self._partial, self.width)
+            rows.append(row)
+            self._partial = rest or None
+        self.shown += len(rows)
+        return rows
+
+
+def _split(text, width):
+    """ Returns tuple (row, remainder) of ``text`` split at ``width``
+        columns, not counting escape sequences.
+    """
+    if _ASCII.match(text):
+        return text[:width], text[width:]
+    col = pos = 0
+    while pos < len(text):
+        match = _ESCAPE.match(text, pos)
+        if match is not None:
+            pos = match.end()
+            continue
+        cells = max(char_width(text[pos]), 0)
+        if col and col + cells > width:
+            break
+        col += cells
+        pos += 1
+    return text[:pos], text[pos:]
@@ -0,0 +1,119 @@
+import collections
+import logging
+import socket
+import time
+
+try:
+    import asyncio
+except ImportError:
+    import tulip as asyncio
+
+__all__ = ['Resolver']
+
+
+class Resolver(object):
+    """
+        Reverse dns lookup of remote addresses, without blocking the event
+        loop, for display of hostnames by connection logging, ``whoami``,
+        ``whereami`` and ``status``. A single instance is shared by all
+        sessions of a server, so that sessions from the same address, such
+        as the many behind a NAT, do not repeat the lookup.
+
+        Hostnames are resolved by ``loop.getnameinfo()``, which calls
+        ``socket.getnameinfo()`` in the loop's default executor. Concurrent
+        lookups of the same address are coalesced into a single request.
+
+        Results are kept in an ``collections.OrderedDict`` of the ``maxsize``
+        most recently used addresses, each expiring ``ttl`` seconds after it
+        was resolved, or ``negative_ttl`` seconds when it failed to resolve.
+    """
+    def __init__(self, maxsize=4096, ttl=60 * 60, negative_ttl=60,
+                 log=logging):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.log = log
+        #: count of ``lookup()`` results, keyed by 'hit', 'miss',
+        #  'coalesced', or 'failed'.
+        self.stats = collections.Counter()
+        #: tuple (expires, hostname), keyed by address, where hostname
+        #  is None when the address failed to resolve.
+        self._cache = collections.OrderedDict()
+        #: list of futures awaiting lookup in progress, keyed by address
+        self._waiters = {}
+
+    def cached(self, addr):
+        """ .. method::cached(addr : str) -> str
+
+            Returns hostname of ``addr`` if resolved and unexpired,
+            otherwise None.
+        """
+        item = self._cache.get(addr)
+        if item is None:
+            return None
+        if time.monotonic() > item[0]:
+            del self._cache[addr]
+            return None
+        self._cache.move_to_end(addr)
+        return item[1]
+
+    def lookup(self, loop, addr):
+        """ .. method::lookup(loop, addr : str) -> Future
+
+            Returns future of hostname of ``addr``, or of None if it does
+            not resolve. Cancelling the future does not cancel the lookup
+            awaited by other sessions.
+        """
+        future = (loop.create_future() if hasattr(loop, 'create_future')
+                  else asyncio.Future(loop=loop))
+        item = self._cache.get(addr)
+        if item is not None and time.monotonic() <= item[0]:
+            self._cache.move_to_end(addr)
+            self.stats['hit'] += 1
+            future.set_result(item[1])
+            return future
+        if addr in self._waiters:
+            self.stats['coalesced'] += 1
+            self._waiters[addr].append(future)
+            return future
+        self.stats['miss'] += 1
+        self._waiters[addr] = [future]
+        if hasattr(loop, 'getnameinfo'):
+            request = loop.getnameinfo((addr, 0), socket.NI_NAMEREQD)
+        else:
+            request = loop.run_in_executor(
+                None, socket.getnameinfo, (addr, 0), socket.NI_NAMEREQD)
+        if not hasattr(request, 'add_done_callback'):
+            # getnameinfo() of asyncio is a coroutine, not a future
+            request = loop.create_task(request)
+        request.add_done_callback(lambda fut: self._resolved(addr, fut))
+        return future
+
+    def _resolved(self, addr, request):
+        """ Cache result of lookup ``request`` of ``addr``, and complete
+            the future of each session awaiting it.
+        """
+        hostname, ttl = None, self.negative_ttl
+        if request.cancelled() or request.exception() is not None:
+            self.stats['failed'] += 1
+            self.log.debug('reverse lookup of {} failed: {}'.format(
+                addr, 'cancelled' if request.cancelled()
+                else request.exception()))
+        else:
+            hostname, ttl = request.result()[0], self.ttl
+        self._cache[addr] = (time.monotonic() + ttl, hostname)
+        self._cache.move_to_end(addr)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        for future in self._waiters.pop(addr, ()):
+            if not future.done():
+                future.set_result(hostname)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __str__(self):
+        """ Returns string describing current cache state. """
+        return '{} addresses, {} hit, {} miss, {} coalesced, {} failed'.format(
+            len(self._cache), self.stats['hit'], self.stats['miss'],
+            self.stats['coalesced'], self.stats['failed'])
@@ -0,0 +1,116 @@
+import collections
+import time
+
+__all__ = ['OutputScheduler']
+
+
+class OutputScheduler(object):
+    """
+        Shares the output bandwidth of the event loop fairly between
+        sessions, so that a few sessions writing megabytes do not delay the
+        keystroke echo of every other session. A single instance is shared
+        by all sessions of a server.
+
+        Each session writes directly to its transport until it has written
+        ``quantum`` bytes in one iteration of the event loop. Further output
+        is queued by its ``TelnetStreamReader``, and written by deficit
+        round-robin: in each iteration, every session with output queued
+        may write up to ``quantum`` bytes, plus any it did not use of its
+        previous turn. Interactive output, such as echo and IAC replies, of
+        sessions without queued output is never delayed.
+
+        The queueing delay of each turn, from the time a session's output
+        is queued, or its previous turn, is tracked.
+    """
+    def __init__(self, loop, quantum=2 ** 14):
+        self.loop = loop
+        self.quantum = quantum
+        #: count of 'rounds', 'turns', and 'bytes' written by turns
+        self.stats = collections.Counter()
+        #: total and greatest queueing delay of turns, in seconds
+        self.delay_total = 0.0
+        self.delay_max = 0.0
+        #: number of iterations of the event loop with output
+        self.tick = 0
+        #: streams with output queued, in order of their next turn
+        self._active = collections.deque()
+        #: handle of ``_round()`` scheduled for the next iteration
+        self._handle = None
+
+    def admit(self, stream, size):
+        """ .. method::admit(stream : TelnetStreamReader, size : int) -> bool
+
+            Returns True if ``size`` bytes of output of ``stream`` may be
+            written directly to its transport in this iteration.
+        """
+        if stream._sched_tick != self.tick:
+            stream._sched_tick = self.tick
+            stream._sched_written = 0
+        if self._handle is None:
+            self._handle = self.loop.call_soon(self._round)
+        if stream._sched_written + size > self.quantum:
+            return False
+        stream._sched_written += size
+        return True
+
+    def activate(self, stream):
+        """ .. method::activate(stream : TelnetStreamReader)
+
+            Write output queued by ``stream`` by its turn of the next
+            rounds, until none remains.
+        """
+        if stream._sched_since is None:
+            stream._sched_since = time.monotonic()
+            stream._sched_deficit = 0
+            self._active.append(stream)
+            if self._handle is None:
+                self._handle = self.loop.call_soon(self._round)
+
+    def _round(self):
+        """ Give each stream with output queued its turn. """
+        self._handle = None
+        self.tick += 1
+        if not self._active:
+            return
+        self.stats['rounds'] += 1
+        now = time.monotonic()
+        for _ in range(len(self._active)):
+            stream = self._active.popleft()
+            if (stream._holding or not stream.output_pending or (
+                    hasattr(stream.transport, 'is_closing')
+                    and stream.transport.is_closing())):
+                # resumed by ``activate()`` when XON is received, or the
+                # transport resumes writing.
+                stream._sched_since = None
+                continue
+            delay = now - stream._sched_since
+            self.delay_total += delay
+            self.delay_max = max(delay, self.delay_max)
+            self.stats['turns'] += 1
+            stream._sched_deficit += self.quantum
+            written = stream._flush_output(stream._sched_deficit)
+            self.stats['bytes'] += written
+            stream._sched_deficit -= written
+            if stream.output_pending and not stream._holding:
+                stream._sched_since = now
+                self._active.append(stream)
+            else:
+                stream._sched_since = None
+        if self._active:
+            self._handle = self.loop.call_soon(self._round)
+
+    @property
+    def delay_mean(self):
+        """ Mean queueing delay of turns, in seconds. """
+        turns = self.stats['turns']
+        return self.delay_total / turns if turns else 0.0
+
+    def __len__(self):
+        return len(self._active)
+
+    def __str__(self):
+        """ Returns string describing scheduler state. """
+        return ('{} sessions queued, {} turns, {} bytes, delay {:0.3f}s '
+                'mean, {:0.3f}s max'.format(
+                    len(self._active), self.stats['turns'],
+                    self.stats['bytes'], self.delay_mean, self.delay_max))
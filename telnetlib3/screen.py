@@ -0,0 +1,101 @@
+import os
+
+from pager import _ESCAPE
+from widths import char_width, string_width
+
+__all__ = ['LineScreen']
+
+
+class LineScreen(object):
+    """
+        Virtual model of the input line of a session, as displayed by its
+        terminal, so that ``TelnetServer.display_prompt(redraw=True)`` need
+        only write the difference between the line displayed and the line
+        edited, rather than erasing and writing the prompt and all input.
+
+        The text displayed is known from the prompt written, and the input
+        echoed since. It is unknown after any other output, or when the
+        line contains control characters, and the full line is redrawn, as
+        is a line that does not fit the width of the window. Columns are
+        counted by ``widths.string_width()``, so that East Asian wide and
+        combining characters are erased and redrawn as displayed.
+    """
+    __slots__ = ('text', 'redraws', 'saved')
+
+    def __init__(self):
+        #: text of line displayed, with cursor at its end, or None
+        self.text = None
+        #: count of redraws, and of bytes saved by their difference
+        self.redraws = self.saved = 0
+
+    def reset(self, text):
+        """ .. method::reset(text : str)
+
+            Line ``text`` has been displayed, with cursor at its end.
+        """
+        self.text = _visible(text)
+
+    def append(self, text):
+        """ .. method::append(text : str)
+
+            Text ``text`` has been echoed at the cursor.
+        """
+        if self.text is not None:
+            text = _visible(text)
+            self.text = self.text + text if text is not None else None
+
+    def invalidate(self):
+        """ Line displayed is no longer known. """
+        self.text = None
+
+    def redraw(self, text, width):
+        """ .. method::redraw(text : str, width : int) -> str
+
+            Returns output that displays line ``text`` in place of the line
+            displayed, in a window of ``width`` columns: the least cursor
+            movement and text, or, when the line displayed is unknown, a
+            carriage return, erase line, and ``text``.
+        """
+        old, self.text = self.text, _visible(text)
+        self.redraws += 1
+        full = '\r\x1b[K' + text
+        if old is None or self.text != text:
+            return full
+        old_width, new_width = string_width(old), string_width(text)
+        if max(old_width, new_width) >= width:
+            return full
+        common = len(os.path.commonprefix((old, text)))
+        while common and (_combines(old, common) or _combines(text, common)):
+            # a combining character is redrawn with the character it follows
+            common -= 1
+        back = string_width(old[common:])
+        move = min(('\b' * back, '\x1b[{}D'.format(back),
+                    '\r' + text[:common]), key=len) if back else ''
+        extra = old_width - new_width
+        erase = min(('\x1b[K', ' ' * extra + '\b' * extra),
+                    key=len) if extra > 0 else ''
+        output = ''.join((move, text[common:], erase))
+        if len(output) >= len(full):
+            return full
+        self.saved += len(full) - len(output)
+        return output
+
+    def __str__(self):
+        """ Returns string describing redraws. """
+        return '{} redraws, {} bytes saved'.format(self.redraws, self.saved)
+
+
+def _visible(text):
+    """ Returns ``text`` as displayed, without escape sequences or BEL, or
+        None if it contains any other control character.
+    """
+    if '\x1b' in text:
+        text = _ESCAPE.sub('', text)
+    text = text.replace('\a', '')
+    return text if string_width(text) >= 0 else None
+
+
+def _combines(text, pos):
+    """ Returns True if character of ``text`` at ``pos`` is of zero width.
+    """
+    return pos < len(text) and char_width(text[pos]) == 0
@@ -4,20 +4,45 @@ import traceback
 import datetime
 import argparse
 import logging
-import codecs
 import shlex
+import socket
+import struct
 import time
 import sys
 
-import tulip
+try:
+    import fcntl
+except ImportError:
+    # windows: urgent data is not detected, see ``_sockatmark()``.
+    fcntl = None
+
+try:
+    # python 3.4 and later: the standard library event loop, having
+    # C-accelerated Future, Task, and transport implementations.
+    import asyncio
+except ImportError:
+    # python 3.3: fallback to the bundled 'tulip' module of PEP 3156.
+    import tulip as asyncio
+import admission
+import charset
+import executor
+import fingerprint
+import pager
+import resolver
+import scheduler
+import screen
+import telstream
+import throttle
+import timing
 import telopt
+import widths
 import teldisp
 #import editing
 from slc import name_slc_command
 
 __all__ = ['TelnetServer']
 
-class TelnetServer(tulip.protocols.Protocol):
+class TelnetServer(asyncio.Protocol):
     """
         The banner() method is called on-connect, displaying the login banner,
         and indicates the desired telnet options. The default implementations
@@ -40,11 +65,53 @@ class TelnetServer(tulip.protocols.Protocol):
         or erroneously display garbage output if remote end is not equipped
         with an iac interpreter.
     """
+    __slots__ = (
+            'log', 'transport', 'stream', 'show_traceback', 'strip_eol',
+            'encoding_errors', 'tab_completion', '_loop', '_admission',
+            '_admit_state', '_admitted', '_client_env', '_default_encoding',
+            '_lastline', '_closing', '_decoder', '_last_received',
+            '_connected', '_advanced', '_literal', '_lit_recv', '_last_char',
+            '_does_styling', '_send_ga', '_send_bell', '_multiline',
+            '_retval', '_fingerprints', '_fingerprint', '_fingerprinted',
+            'reader', 'writer', '_shell', '_shell_task', '_write_paused',
+            '_drain_waiter', '_executors', '_pending_cmd', '_cmd_queue',
+            '_resolver', '_hostname', '_xoff_maxsize', '_xoff_overflow',
+            '_urgent_fd', '_rtt_stats', '_rtt_interval', '_srtt', '_rttvar',
+            '_tm_sent', '_rtt_timer', '_enc_in', '_enc_out', '_ascii_in',
+            '_ascii_out', '_decoder_partial', '_echo_buf', '_input_bucket',
+            '_input_timer', '_cmd_quota', '_cmd_deferred', '_pastes',
+            '_throttled', '_scheduler', '_send_task', '_streamed_bytes',
+            '_streamed_time', '_pager', '_screen', )
 
     CONNECT_MINWAIT = 0.50
     CONNECT_MAXWAIT = 4.00
     CONNECT_DEFERED = 0.15
+    #: when set, bytes per second assumed of each client's connection, so
+    #  that the transport's high-water mark is raised to the product of
+    #  bandwidth and smoothed round-trip time, keeping more output in
+    #  flight to distant clients; see ``adapt_write_buffer()``.
+    RTT_BANDWIDTH = None
+    #: input of at least this many bytes, or of more than one line, received
+    #  at once is a paste, ingested by runs of printable characters.
+    PASTE_MINSIZE = 16
+    #: when True, ``display_prompt(redraw=True)`` of terminals that support
+    #  styling writes only the difference from the line displayed, tracked
+    #  by a ``screen.LineScreen``.
+    REDRAW_DIFF = True
     TTYPE_LOOPMAX = 8
+    #: negotiation plan sent by ``banner()``: a tuple of (cmd, opt) offers
+    #  and requests, pre-encoded once and sent in a single write.
+    connect_plan = ((telopt.WILL, telopt.SGA),
+                    (telopt.WILL, telopt.ECHO),
+                    (telopt.DO, telopt.TTYPE), )
+    #: negotiation plan sent by ``request_advanced_opts()``.
+    advanced_plan = ((telopt.DO, telopt.LINEMODE),
+                     (telopt.WILL, telopt.STATUS),
+                     (telopt.WILL, telopt.LFLOW),
+                     (telopt.DO, telopt.NEW_ENVIRON),
+                     (telopt.DO, telopt.NAWS),
+                     (telopt.DO, telopt.CHARSET),
+                     (telopt.DO, telopt.TTYPE), )
     default_env = {'COLUMNS': '80',
                    'LINES': '24',
                    'USER': 'unknown',
@@ -82,8 +149,88 @@ class TelnetServer(tulip.protocols.Protocol):
         ('logoff', None),
         ])
 
-    def __init__(self, log=logging, default_encoding='utf8'):
+    def __init__(self, log=logging, default_encoding='utf8', loop=None,
+                 admission=None, fingerprints=None, shell=None,
+                 executors=None, resolver=None, xoff_maxsize=None,
+                 xoff_overflow=None, rtt_stats=None, rtt_interval=None,
+                 input_rate=None, input_burst=None, cmd_quota=None,
+                 scheduler=None):
         self.log = log
+        #: event loop, ``asyncio.get_event_loop()`` on connect if unset.
+        self._loop = loop
+        #: ``admission.AdmissionControl`` instance shared by all sessions
+        self._admission = admission
+        #: ``fingerprint.FingerprintCache`` instance shared by all sessions
+        self._fingerprints = fingerprints
+        #: ``executor.CommandExecutor`` instances shared by all sessions,
+        #  keyed by name, such as 'thread' or 'process', see ``offload_cmd()``
+        self._executors = executors or {}
+        #: ``resolver.Resolver`` instance shared by all sessions
+        self._resolver = resolver
+        #: hostname of remote end, once resolved
+        self._hostname = None
+        #: maximum size of output buffered while stopped by XOFF, and
+        #  policy when exceeded, see ``TelnetStreamReader.XOFF_OVERFLOW``.
+        self._xoff_maxsize = xoff_maxsize
+        self._xoff_overflow = xoff_overflow
+        #: ``timing.RoundTripStats`` instance shared by all sessions
+        self._rtt_stats = rtt_stats
+        #: seconds between round-trip time probes, see ``probe_rtt()``
+        self._rtt_interval = rtt_interval
+        #: smoothed round-trip time and its mean deviation (jitter), in
+        #  seconds, once measured.
+        self._srtt = self._rttvar = None
+        #: ``loop.time()`` of pending IAC DO TM probe, if any
+        self._tm_sent = None
+        #: handle of scheduled ``_rtt_tick()``
+        self._rtt_timer = None
+        #: file descriptor of socket tested for urgent data ("Synch")
+        self._urgent_fd = None
+        #: ``throttle.TokenBucket`` limiting input to ``input_rate`` bytes
+        #  per second, if any, and handle of scheduled ``_resume_input()``
+        self._input_bucket = (throttle.TokenBucket(input_rate, input_burst)
+                              if input_rate else None)
+        self._input_timer = None
+        #: ``throttle.CommandQuota`` instance shared by all sessions
+        self._cmd_quota = cmd_quota
+        #: ``scheduler.OutputScheduler`` instance shared by all sessions
+        self._scheduler = scheduler
+        #: True while ``_drain_cmds()`` is deferred by ``cmd_quota``
+        self._cmd_deferred = False
+        #: count of input pasted, and of reading paused by ``input_rate``
+        self._pastes = self._throttled = 0
+        #: future of offloaded command awaiting completion, if any
+        self._pending_cmd = None
+        #: task of ``send_stream()`` sending output, if any, and total
+        #  bytes sent, and seconds spent, by all streams of session.
+        self._send_task = None
+        self._streamed_bytes, self._streamed_time = 0, 0.0
+        #: ``pager.Pager`` of output displayed by ``page()``, if any
+        self._pager = None
+        #: ``screen.LineScreen`` of input line displayed, if any
+        self._screen = screen.LineScreen() if self.REDRAW_DIFF else None
+        #: deque of input lines received while a command is pending
+        self._cmd_queue = None
+        #: fingerprint of client, determined on first TTYPE received
+        self._fingerprint = None
+        #: record of negotiation outcome cached for fingerprint, if known
+        self._fingerprinted = None
+        #: coroutine function ``shell(reader, writer)`` run in place of
+        #  the first prompt, see module ``telstream``.
+        self._shell = shell
+        #: ``telstream.TelnetReader`` and ``TelnetWriter`` of ``shell``
+        self.reader = self.writer = None
+        #: task of running ``shell`` coroutine
+        self._shell_task = None
+        #: True while transport has paused writing
+        self._write_paused = False
+        #: future completed when transport resumes writing
+        self._drain_waiter = None
+        #: None until admitted, then 'negotiating' until first prompt,
+        #  and finally 'negotiated'.
+        self._admit_state = None
+        #: time session was admitted, when negotiation begins
+        self._admitted = None
         #: cient_env holds client session variables
         self._client_env = collections.defaultdict(str, **self.default_env)
         self._client_env['CHARSET'] = default_encoding
@@ -104,6 +251,16 @@ class TelnetServer(tulip.protocols.Protocol):
         self._closing = False
         #: codecs.IncrementalDecoder for current CHARSET
         self._decoder = None
+        #: True while ``_decoder`` holds an incomplete multibyte sequence
+        self._decoder_partial = False
+        #: negotiated input and output encoding, cached until BINARY or
+        #  CHARSET changes, and whether each is ascii-compatible, so that
+        #  7-bit data may be decoded and encoded without the codec.
+        self._enc_in = self._enc_out = None
+        self._ascii_in = self._ascii_out = False
+        #: list of strings echoed by ``local_echo()`` while processing
+        #  input of ``data_received()``, written once by ``_flush_echo()``
+        self._echo_buf = None
         #: time since last byte received
         self._last_received = None
         #: time connection was made
@@ -134,27 +291,138 @@ class TelnetServer(tulip.protocols.Protocol):
         #   Notably, a request to negotiate TTYPE is made. If sucessful,
         #   the callback ``request_advanced_opts()`` is fired.
         self.echo ('Welcome to {}! '.format(__file__,))
-        self.stream.iac(telopt.WILL, telopt.SGA)
-        self.stream.iac(telopt.WILL, telopt.ECHO)
-        self.stream.iac(telopt.DO, telopt.TTYPE)
+        self.stream.iac_plan(self.connect_plan)
 
     def first_prompt(self, call_after=None):
         """ XXX First time prompt fire
         """
-        call_after = self.display_prompt if call_after is None else call_after
+        if call_after is None:
+            call_after = (self.display_prompt if self._shell is None
+                          else self._start_shell)
         assert callable(call_after), call_after
 
         self.log.info(self.about_connection())
+        if self._advanced:
+            # client has an iac interpreter, measure round-trip time
+            self.probe_rtt()
+            if self._rtt_interval:
+                self._rtt_timer = self._loop.call_later(
+                    self._rtt_interval, self._rtt_tick)
         # conceivably, you could use various callback mechanisms to
         # relate to authenticating or other multi-state login process.
-        loop = tulip.get_event_loop()
-        loop.call_soon(call_after)
+        self._loop.call_soon(call_after)
+
+    def probe_rtt(self):
+        """ Send IAC DO TM (TIMING-MARK) to measure round-trip time until
+            its reply, WILL or WONT TM, is received by ``timing_mark_received``.
+            Input is not discarded meanwhile. Returns False if a probe is
+            already pending.
+        """
+        if self._tm_sent is not None:
+            return False
+        if not self.stream.request_timing_mark(discard=False):
+            return False
+        self._tm_sent = self._loop.time()
+        if self._rtt_stats is not None:
+            self._rtt_stats.stats['sent'] += 1
+        return True
+
+    def timing_mark_received(self, cmd):
+        """ Callback for reply ``cmd``, WILL or WONT, to IAC DO TM: update
+            smoothed round-trip time and jitter, as by rfc6298.
+        """
+        if self._tm_sent is None:
+            return
+        rtt = self._loop.time() - self._tm_sent
+        self._tm_sent = None
+        if self._srtt is None:
+            self._srtt, self._rttvar = rtt, rtt / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+        self.log.debug('rtt {:0.3f}s, smoothed {:0.3f}s, jitter {:0.3f}s'
+                       .format(rtt, self._srtt, self._rttvar))
+        if self._rtt_stats is not None:
+            self._rtt_stats.record('{}@{}'.format(
+                self.env['USER'], self.peername[0]),
+                rtt, self._srtt, self._rttvar)
+        self.adapt_write_buffer()
+
+    def adapt_write_buffer(self):
+        """ Raise transport's high-water mark to the product of
+            ``RTT_BANDWIDTH`` and smoothed round-trip time, when set.
+        """
+        if (self.RTT_BANDWIDTH is None or self._srtt is None
+                or not hasattr(self.transport, 'set_write_buffer_limits')):
+            return
+        high = min(max(int(self.RTT_BANDWIDTH * self._srtt), 2 ** 16),
+                   2 ** 22)
+        self.transport.set_write_buffer_limits(high=high)
+
+    def _rtt_tick(self):
+        """ Probe round-trip time each ``rtt_interval`` seconds. A probe
+            left unanswered for an interval is counted as lost, and expired,
+            so that its late reply is ignored, and another sent in its place.
+        """
+        self._rtt_timer = None
+        if self._closing:
+            return
+        if self._tm_sent is not None:
+            if self._rtt_stats is not None:
+                self._rtt_stats.stats['lost'] += 1
+            self.stream.expire_timing_mark()
+            self._tm_sent = None
+        self.probe_rtt()
+        self._rtt_timer = self._loop.call_later(
+            self._rtt_interval, self._rtt_tick)
+
+    @property
+    def rtt(self):
+        """ Smoothed round-trip time in seconds, or None if unmeasured.
+        """
+        return self._srtt
+
+    @property
+    def rtt_jitter(self):
+        """ Mean deviation of round-trip time in seconds, or None.
+        """
+        return self._rttvar
+
+    def _start_shell(self):
+        """ Start coroutine ``shell(reader, writer)`` as a task, closing
+            the connection when it completes.
+        """
+        self.reader = telstream.TelnetReader(self)
+        self.writer = telstream.TelnetWriter(self)
+        coro = self._shell(self.reader, self.writer)
+        if hasattr(self._loop, 'create_task'):
+            self._shell_task = self._loop.create_task(coro)
+        else:
+            self._shell_task = asyncio.Task(coro, loop=self._loop)
+        self._shell_task.add_done_callback(self._shell_done)
+
+    def _shell_done(self, task):
+        """ Callback when task of ``shell`` coroutine completes. """
+        if not task.cancelled() and task.exception() is not None:
+            err = task.exception()
+            self._display_tb(type(err), err, err.__traceback__,
+                             level=logging.INFO)
+        if not self._closing:
+            self.stream.drain_output()
+            self.transport.close()
 
     def display_prompt(self, redraw=False, input=None):
         """ XXX Prompts client end for input. """
         input = self.lastline if input is None else input
-        parts = (('\r\x1b[K') if redraw else ('\r\n'), self.prompt, input,)
-        self.echo(''.join(parts))
+        line = ''.join((self.prompt, input,))
+        if not redraw:
+            self.echo('\r\n' + line)
+        elif self._screen is not None and self._does_styling:
+            self._echo(self._screen.redraw(line, self._window_size()[0]))
+        else:
+            self.echo('\r\x1b[K' + line)
+        if self._screen is not None:
+            self._screen.reset(line)
         if self._send_ga:
             self.stream.send_ga()
 
@@ -236,10 +504,34 @@ class TelnetServer(tulip.protocols.Protocol):
             self.local_echo(char_disp)
         self._last_char = char
 
+    def _paste_received(self, ucs):
+        """ Receive printable ascii string ``ucs`` of pasted input, as
+            ``character_received()`` does each character.
+        """
+        self._lastline.extend(ucs)
+        self.local_echo(ucs.replace(' ', self.standout(' ')))
+        self._last_char = ucs[-1]
+
     def line_received(self, input, eor=False):
         """ XXX Callback for each telnet input line received.
         """
         self.log.debug('line_received: {!r}'.format(input))
+        if (self._pending_cmd is not None or self._cmd_queue
+                or not self._acquire_cmd()):
+            # preserve order of output, process after pending command,
+            # or the next iteration of ``cmd_quota``.
+            if self._cmd_queue is None:
+                self._cmd_queue = collections.deque()
+            self._cmd_queue.append((input, eor))
+            self._lastline.clear()
+            if self._pending_cmd is None:
+                self._defer_cmds()
+            return
+        self._process_line(input, eor)
+
+    def _process_line(self, input, eor=False):
+        """ Process input line by ``process_cmd()``, and prompt.
+        """
         if self.strip_eol:
             input = input.rstrip(self.strip_eol)
         self._multiline = False
@@ -251,7 +543,10 @@ class TelnetServer(tulip.protocols.Protocol):
             self._retval = -1
         finally:
             # when _retval is None, we are multi-line
-            if self._retval is not None:
+            if self._pending_cmd is not None:
+                # command was offloaded, prompt when it completes
+                self._lastline.clear()
+            elif self._retval is not None:
                 # command was processed, clear line buffer and prompt
                 self._lastline.clear()
                 self.display_prompt()
@@ -261,14 +556,15 @@ class TelnetServer(tulip.protocols.Protocol):
                 self.display_prompt(input='')
 
     def interrupt_received(self, cmd):
-        """ This method aborts any output waiting on transport, then calls
+        """ This method aborts any output queued for transport, then calls
             ``prompt()`` to solicit a new command, retaining the existing
             command buffer, if any.
 
             This is suitable for the receipt of interrupt signals, or for
             iac(AO) and SLC_AO.
         """
-        self.transport.discard_output()
+        self.stream.discard_output()
+        self.cancel_cmd()
         self.log.debug(telopt._name_command(cmd))
         self.echo('\r\n ** {}'.format(telopt._name_command(cmd)))
         self.display_prompt()
@@ -410,6 +706,8 @@ class TelnetServer(tulip.protocols.Protocol):
             if ucs is not None:
                 self.literal_received(ucs)
         elif slc == telopt.SLC_RP:  # repaint (^r)
+            if self._screen is not None:
+                self._screen.invalidate()
             self.display_prompt(redraw=True)
         elif slc == telopt.SLC_EC:  # erase character chr(127)
             if 0 == len(self._lastline):
@@ -437,6 +735,7 @@ class TelnetServer(tulip.protocols.Protocol):
                 self.bell()
         elif slc in (telopt.SLC_IP, telopt.SLC_ABORT):
             # interrupt process (^C), abort process (^\)
+            self.cancel_cmd()
             self._lastline.clear()
             self.echo(char_disp)
             self.display_prompt()
@@ -444,7 +743,12 @@ class TelnetServer(tulip.protocols.Protocol):
                 telopt.SLC_AYT, telopt.SLC_SUSP):
             # handled by callbacks or not really an editing cmd
             pass
-        elif slc in (telopt.SLC_AO, telopt.SLC_SYNCH, telopt.SLC_EOR):
+        elif slc == telopt.SLC_AO:
+            # abort output (^o), discarded by stream callback ``handle_ao``
+            self.cancel_cmd()
+            self.echo(char_disp)
+            self.display_prompt()
+        elif slc in (telopt.SLC_SYNCH, telopt.SLC_EOR):
             # all others (unhandled)
             self.log.debug('recv {}'.format(name_slc_command(slc)))
             self.echo(char_disp)
@@ -462,23 +766,112 @@ class TelnetServer(tulip.protocols.Protocol):
         """
         self.log.debug('data_received: {!r}'.format(data))
         self._last_received = datetime.datetime.now()
-        for byte in (bytes([value]) for value in data):
-            self.stream.feed_byte(byte)
-            if self.stream.is_oob:
-                continue  # stream processed an IAC command,
-            elif self.stream.slc_received:
-                self.editing_received(byte, self.stream.slc_received)
-            else:
-                ucs = self.decode(byte, final=False)
-                if ucs is not None and ucs != '':
-                    if self.is_literal is not False:
-                        self.literal_received(ucs)
-                    else:
-                        self.character_received(ucs)
+        if (self._urgent_fd is not None and data.endswith(telopt.IAC)
+                and _sockatmark(self._urgent_fd)):
+            # reading stops at the urgent mark: all data preceding it,
+            # until IAC DM, is discarded as "Synch". The urgent byte is
+            # the DM of IAC DM, so that a read stopped at the mark ends
+            # with IAC; only then is the mark tested, by ioctl(2).
+            self.stream.urgent_received()
+        if (self._input_bucket is not None
+                and not self._input_bucket.consume(len(data))):
+            self._throttle_input()
+        inband = bytearray() if self.reader is not None else None
+        # a burst of input, such as pasted by the client, is ingested by
+        # runs of printable characters, rather than by character.
+        paste = (inband is None and (len(data) >= self.PASTE_MINSIZE
+                                     or data.count(b'\r') > 1)
+                 and self.character_received.__func__
+                 is TelnetServer.character_received)
+        if paste:
+            self._pastes += 1
+        # remote echo of characters received is written once, rather than
+        # once for each character, see ``local_echo()``.
+        self._echo_buf = [] if inband is None else None
+        try:
+            pos = 0
+            while pos < len(data):
+                if (paste and self._literal is False
+                        and self._pager is None
+                        and not self._decoder_partial):
+                    end = self.stream.inband_run(data, pos)
+                    if end > pos:
+                        self._paste_received(data[pos:end].decode('ascii'))
+                        pos = end
+                        continue
+                byte = data[pos:pos + 1]
+                pos += 1
+                if self._echo_buf and (byte < b' ' or byte == b'\x7f'
+                                       or byte == telopt.IAC):
+                    # preserve order of echo and output of commands
+                    # and special characters processed by stream.
+                    self._flush_echo()
+                self.stream.feed_byte(byte)
+                if self.stream.is_oob:
+                    continue  # stream processed an IAC command,
+                elif inband is not None:
+                    # in-band data is read by ``shell``, CR NUL as CR LF.
+                    if byte == b'\x00' and self._last_char == '\r':
+                        byte = b'\n'
+                    self._last_char = '\r' if byte == b'\r' else None
+                    inband.extend(byte)
+                elif self.stream.slc_received:
+                    self.editing_received(byte, self.stream.slc_received)
+                else:
+                    ucs = self.decode(byte, final=False)
+                    if ucs is not None and ucs != '':
+                        if self._pager is not None:
+                            self.pager_received(ucs)
+                        elif self.is_literal is not False:
+                            self.literal_received(ucs)
+                        else:
+                            self.character_received(ucs)
+            self._flush_echo()
+        finally:
+            self._echo_buf = None
+        if inband:
+            if self.stream.local_option.enabled(telopt.ECHO):
+                self.stream.write(bytes(inband), oob=True)
+            self.reader.feed_data(bytes(inband))
+
+    def _throttle_input(self):
+        """ Pause reading from transport until ``input_rate`` permits.
+        """
+        if (self._input_timer is not None or self._closing
+                or not hasattr(self.transport, 'pause_reading')):
+            return
+        self._throttled += 1
+        self.log.debug('input throttled for {:0.3f}s'.format(
+            self._input_bucket.delay))
+        self.transport.pause_reading()
+        self._input_timer = self._loop.call_later(
+            self._input_bucket.delay, self._resume_input)
+
+    def _resume_input(self):
+        self._input_timer = None
+        if not self._closing:
+            self.transport.resume_reading()
+
+    def _flush_echo(self):
+        """ Write output of ``local_echo()`` buffered by ``data_received()``.
+        """
+        if self._echo_buf:
+            ucs = ''.join(self._echo_buf)
+            self._echo_buf.clear()
+            self._echo(ucs)
 
     def echo(self, ucs, errors=None):
         """ Write unicode string to transport using preferred encoding.
         """
+        if self._screen is not None:
+            # input line displayed is overwritten, see ``display_prompt()``
+            self._screen.invalidate()
+        self._echo(ucs, errors)
+
+    def _echo(self, ucs, errors=None):
+        """ Write unicode string, as ``echo()``, of the input line. """
+        if self._echo_buf:
+            self._flush_echo()
         errors = errors if errors is not None else self.encoding_errors
         try:
             self.stream.write(self.encode(ucs, errors))
@@ -487,12 +880,11 @@ class TelnetServer(tulip.protocols.Protocol):
             self._env_update({'CHARSET': self._default_encoding})
             self.log.debug(err)
             self._display_charset_err(err)
-            return self.echo(ucs, errors)
+            return self._echo(ucs, errors)
 
     def about_connection(self):
         """ Returns string suitable for status of server session.
         """
-            # tulip asynchronous dns lookup!
         return '{}{}{}{}'.format(
                 '{}{} '.format(self.env['USER'],
                     ' using' if self.env['TERM'] != 'unknown' else ''),
@@ -500,9 +892,20 @@ class TelnetServer(tulip.protocols.Protocol):
                 if self.env['TERM'] != 'unknown' else '',
                 '{}connected from '.format(
                     'dis' if self._closing else ''),
-                self.transport.get_extra_info('addr', '??')[0],
+                ('{} ({})'.format(self._hostname, self.peername[0])
+                    if self._hostname is not None else self.peername[0]),
                 ' after {:0.3f}s'.format(self.duration))
 
+    @property
+    def peername(self):
+        """ Returns address of remote end as tuple (host, port, ...).
+        """
+        #   asyncio transports provide 'peername', the bundled tulip
+        #   transport provides 'addr'.
+        return (self.transport.get_extra_info('peername', None)
+                or self.transport.get_extra_info('addr', None)
+                or ('unknown', -1))
+
     @property
     def env(self):
         """ Returns hash of session environment values
@@ -626,9 +1029,20 @@ class TelnetServer(tulip.protocols.Protocol):
 
     def local_echo(self, ucs, errors=None):
         """ Calls ``echo(ucs, errors`` only of local option ECHO is True.
+
+            Within ``data_received()``, ``ucs`` is buffered and written once
+            for all input received.
         """
         if self.stream.local_option.enabled(telopt.ECHO):
-            self.echo(ucs, errors)
+            if self._echo_buf is not None and errors is None:
+                self._echo_buf.append(ucs)
+            else:
+                self._echo(ucs, errors)
+            if self._screen is not None:
+                self._screen.append(ucs)
+        elif self._screen is not None:
+            # input is echoed by client
+            self._screen.invalidate()
 
     def process_cmd(self, input):
         """ .. method:: process_cmd(input : string) -> int
@@ -664,8 +1078,14 @@ class TelnetServer(tulip.protocols.Protocol):
         elif cmd == 'whoami':
             self.echo('\r\n{}.'.format(self.about_connection()))
         elif cmd == 'whereami':
-# XXX tulip asynchronous dns lookup!
-            self.echo('\r\n{}.'.format(self))
+            sockname = self.transport.get_extra_info('sockname')
+            if self._resolver is not None:
+                self._await_cmd(self._resolver.lookup(
+                    self._loop, sockname[0]), callback=lambda hostname:
+                    self.echo('\r\n{}:{}.'.format(
+                        hostname or sockname[0], sockname[1])))
+            else:
+                self.offload_cmd(executor.THREAD, _whereami, sockname)
         elif cmd == 'set':
             return self.cmdset_set(*args)
         elif cmd == 'toggle':
@@ -677,14 +1097,309 @@ class TelnetServer(tulip.protocols.Protocol):
             return 1
         return 0
 
+    def offload_cmd(self, name, func, *args, callback=None):
+        """ .. method::offload_cmd(name : str, func : callable, *args,
+                                     callback=None)
+
+            Run ``func(*args)`` by the executor ``name`` of ``executors``,
+            or directly when no such executor is configured, so that
+            blocking or cpu-heavy commands do not stall other sessions.
+
+            ``callback(result)`` is called with the result, returning the
+            command's exit value (None for 0), or, by default, the result
+            is displayed.
+            Input lines received meanwhile are processed in order, only
+            after the result and a new prompt are displayed. A pending
+            command is cancelled by ``cancel_cmd()``.
+        """
+        runner = self._executors.get(name)
+        if runner is None:
+            self._retval = self._offload_result(func(*args), callback)
+            return
+        self._await_cmd(runner.submit(self._loop, func, *args), callback)
+
+    def _await_cmd(self, future, callback=None):
+        """ Display result of ``future`` as described by ``offload_cmd()``,
+            once completed.
+        """
+        self._pending_cmd = future
+        future.add_done_callback(
+            lambda fut: self._offload_done(fut, callback))
+
+    def _offload_result(self, result, callback):
+        if callback is not None:
+            retval = callback(result)
+            return 0 if retval is None else retval
+        self.echo('\r\n{}.'.format(result))
+        return 0
+
+    def _offload_done(self, future, callback):
+        """ Display result of offloaded command ``future``, then prompt
+            and process any input lines queued meanwhile.
+        """
+        if future is not self._pending_cmd:
+            # cancelled by cancel_cmd(), or connection lost.
+            return
+        self._pending_cmd = None
+        try:
+            self._retval = self._offload_result(future.result(), callback)
+        except Exception:
+            self._display_tb(*sys.exc_info(), level=logging.INFO)
+            self.bell()
+            self._retval = -1
+        self.display_prompt()
+        self._drain_cmds()
+
+    def _acquire_cmd(self):
+        """ Returns True if a command may be processed by ``cmd_quota``.
+        """
+        return (self._cmd_quota is None
+                or self._cmd_quota.acquire(self._loop, self))
+
+    def _defer_cmds(self):
+        """ Process input lines queued by ``line_received()`` in the next
+            iteration of ``cmd_quota``.
+        """
+        if not self._cmd_deferred and self._cmd_quota is not None:
+            self._cmd_deferred = True
+            self._cmd_quota.defer(self._loop, self._drain_cmds)
+
+    def _drain_cmds(self):
+        """ Process input lines queued by ``line_received()``, while no
+            command is pending, and ``cmd_quota`` permits.
+        """
+        self._cmd_deferred = False
+        while (self._cmd_queue and self._pending_cmd is None
+                and not self._closing):
+            if not self._acquire_cmd():
+                self._defer_cmds()
+                return
+            self._process_line(*self._cmd_queue.popleft())
+
+    def cancel_cmd(self):
+        """ Cancel pending offloaded command, if any, discarding its
+            result, and input lines received meanwhile, and any output of
+            ``send_stream()`` or ``page()`` not yet sent. A command already
+            running in a pool of workers is left to complete, unseen.
+        """
+        future, self._pending_cmd = self._pending_cmd, None
+        task, self._send_task = self._send_task, None
+        self._pager = None
+        if self._cmd_queue:
+            self._cmd_queue.clear()
+        if task is not None:
+            task.cancel()
+        if future is not None:
+            future.cancel()
+            self._retval = -1
+
+    def send_stream(self, source, callback=None, chunk_size=None):
+        """ .. method::send_stream(source, callback=None,
+                                   chunk_size=None) -> asyncio.Task
+
+            Send output of ``source`` one chunk at a time, pulling the next
+            chunk only as the transport drains, so that large transfers use
+            constant memory and do not flood the event loop. Returns task
+            whose result is the number of bytes sent.
+
+            ``source`` is a file or ``mmap.mmap``, read ``chunk_size``
+            (by default ``FLUSH_SIZE``) at a time, or an iterable such as a
+            generator, or an asynchronous iterator, whose items are joined
+            until ``chunk_size`` is reached. Chunks of str are encoded by
+            the session's preferred encoding, chunks of bytes are sent
+            as-is, both escaping IAC.
+
+            Called by ``process_cmd()``, the stream is awaited as a pending
+            command, described by ``offload_cmd()``; ``callback(nbytes)``,
+            if any, is called on completion. It is cancelled by
+            ``cancel_cmd()``, as by receipt of AO or IP.
+        """
+        coro = self._send_source(
+            source, chunk_size or self.stream.FLUSH_SIZE)
+        if hasattr(self._loop, 'create_task'):
+            task = self._loop.create_task(coro)
+        else:
+            task = asyncio.Task(coro, loop=self._loop)
+        if self._send_task is not None:
+            self._send_task.cancel()
+        self._send_task = task
+        task.add_done_callback(self._send_done)
+        if self._shell is None:
+            self._await_cmd(task, callback or (lambda nbytes: None))
+        return task
+
+    def page(self, lines, callback=None):
+        """ .. method::page(lines : iterable, callback=None)
+
+            Display unicode strings of iterable ``lines``, without line
+            endings, a window at a time, sized by the ``LINES`` and
+            ``COLUMNS`` negotiated by NAWS. Lines are pulled from ``lines``
+            only as they are displayed, so that paging a listing of any
+            length holds only a window of it in memory.
+
+            When more than a page remains, it is awaited as a pending
+            command, described by ``offload_cmd()``, and keystrokes are
+            received by ``pager_received()``; ``callback(rows)``, if any, is
+            called with the number of rows displayed. Paging is stopped by
+            ``cancel_cmd()``, as by receipt of AO or IP. In a ``shell``
+            session, all lines are displayed.
+        """
+        if self._shell is not None:
+            # keystrokes are read by ``shell``, display all
+            for line in lines:
+                self.echo('\r\n{}'.format(line))
+            return
+        self._pager = pager.Pager(iter(lines), *self._window_size())
+        self._display_page(erase=False)
+        if self._pager.done:
+            self._pager = None
+            return
+        if hasattr(self._loop, 'create_future'):
+            future = self._loop.create_future()
+        else:
+            future = asyncio.Future(loop=self._loop)
+        self._await_cmd(future, callback or (lambda rows: None))
+
+    def pager_received(self, char):
+        """ .. method::pager_received(char : str)
+
+            Receive keystroke ``char`` of ``page()``: space displays the
+            next page, return the next line, and 'q' stops paging. In
+            linemode, a line beginning with 'q' stops paging, and any
+            other displays the next page.
+        """
+        last_char, self._last_char = self._last_char, char
+        if self.stream.is_linemode:
+            # client sends input only at end of line
+            if char in ('\n', '\x00'):
+                return
+            elif char != '\r':
+                self._lastline.append(char)
+                return
+            char = 'q' if self.lastline.lstrip()[:1] in ('q', 'Q') else ' '
+            self._lastline.clear()
+        if char in ('q', 'Q'):
+            self.echo('\r\x1b[K')
+            self._pager_done()
+        elif char == ' ':
+            self._display_page()
+        elif char == '\r':
+            self._display_page(count=1)
+        elif char in ('\n', '\x00') and last_char == '\r':
+            pass
+        else:
+            self.bell()
+
+    def _display_page(self, count=None, erase=True):
+        """ Display next ``count`` rows of ``page()``, by default a page,
+            replacing the prompt of the pager when ``erase`` is True.
+        """
+        rows = self._pager.rows(count)
+        self.echo('{}{}'.format('\r\x1b[K' if erase else '\r\n',
+                                '\r\n'.join(rows)))
+        if not self._pager.done:
+            self.echo('\r\n{}'.format(self.standout('--More--')))
+        elif erase:
+            self._pager_done()
+
+    def _pager_done(self):
+        """ Complete pending command of ``page()``. """
+        future, rows = self._pending_cmd, self._pager.shown
+        self._pager = None
+        if future is not None and not future.done():
+            future.set_result(rows)
+
+    def _window_size(self):
+        """ Returns tuple (width, height) of window negotiated by NAWS,
+            or set by ``COLUMNS`` and ``LINES``, or the default values.
+        """
+        size = []
+        for key in ('COLUMNS', 'LINES'):
+            try:
+                value = int(self.env[key])
+            except ValueError:
+                value = 0
+            size.append(value if value > 0 else int(self.default_env[key]))
+        return tuple(size)
+
+    def _send_done(self, task):
+        if task is self._send_task:
+            self._send_task = None
+
+    @telstream.coroutine
+    def _send_source(self, source, chunk_size):
+        """ Coroutine of ``send_stream()``. """
+        if hasattr(source, '__aiter__'):
+            aiter, items = source.__aiter__(), None
+        elif hasattr(source, 'read'):
+            aiter, items = None, None
+        else:
+            aiter, items = None, iter(source)
+        sent, start = 0, time.monotonic()
+        try:
+            while not self._closing:
+                waiter = self.drain_waiter()
+                if waiter is not None:
+                    yield from waiter
+                    continue
+                if aiter is None and items is None:
+                    chunk = source.read(chunk_size)
+                    exhausted = not chunk
+                else:
+                    # join items, such as lines, up to chunk_size, so that
+                    # they are encoded and escaped a chunk at a time.
+                    batch, size, exhausted = [], 0, False
+                    while size < chunk_size and not exhausted:
+                        if aiter is not None:
+                            try:
+                                item = yield from (
+                                    aiter.__anext__().__await__())
+                            except StopAsyncIteration:
+                                exhausted = True
+                                continue
+                        else:
+                            item = next(items, None)
+                            if item is None:
+                                exhausted = True
+                                continue
+                        batch.append(item)
+                        size += len(item)
+                    if all(isinstance(item, str) for item in batch):
+                        chunk = ''.join(batch)
+                    else:
+                        chunk = b''.join(
+                            self.encode(item) if isinstance(item, str)
+                            else item for item in batch)
+                if chunk:
+                    if isinstance(chunk, str):
+                        chunk = self.encode(chunk)
+                    self.stream.write(chunk)
+                    sent += len(chunk)
+                if exhausted:
+                    break
+                # a single callback in the ready queue per chunk sent
+                yield from asyncio.sleep(0)
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+            elapsed = time.monotonic() - start
+            self._streamed_bytes += sent
+            self._streamed_time += elapsed
+            self.log.info('{}: streamed {} bytes in {:0.3f}s ({:0.1f} kB/s)'
+                          .format(self.about_connection(), sent, elapsed,
+                                  sent / max(elapsed, 1e-6) / 1024))
+        return sent
+
     def can_write(self, ucs):
         """ .. method::can_display(string) -> bool
 
             True if client end can receive character as a simple cell
             glyph: if character is 7-bit ascii and not a control character,
-            or has 8th bit set but outbinary is true.
+            or has 8th bit set but outbinary is true, and is not a control
+            character, see ``widths.char_width()``.
         """
-        return ord(ucs) > 32 and (ord(ucs) < 127 or self.outbinary)
+        return ord(ucs) > 32 and (ord(ucs) < 127 or self.outbinary
+                                  and widths.char_width(ucs) >= 0)
 
     def encode(self, buf, errors=None):
         """ Encode byte buffer using client-preferred encoding.
@@ -694,35 +1409,60 @@ class TelnetServer(tulip.protocols.Protocol):
             outside of this range will be replaced with a python-like
             representation.
         """
+        if self._enc_out is None:
+            self._cache_codecs()
+        if self._ascii_out and _isascii(buf):
+            return buf.encode('ascii')
         errors = errors if errors is not None else self.encoding_errors
-        return bytes(buf, self.encoding(outgoing=True), errors)
+        return bytes(buf, self._enc_out, errors)
 
     def decode(self, input, final=False):
         """ Decode bytes received from client using preferred encoding.
         """
+        if self._enc_in is None:
+            self._cache_codecs()
+        if self._ascii_in and not self._decoder_partial and _isascii(input):
+            return input.decode('ascii')
         if (self._decoder is None or
-                self._decoder._encoding
-                != self.encoding(incoming=True)):
+                self._decoder._encoding != self._enc_in):
             try:
-                self._decoder = codecs.getincrementaldecoder(
-                        self.encoding(incoming=True))(
-                        errors=self.encoding_errors)
-                self._decoder._encoding = self.encoding(incoming=True)
+                self._decoder = charset.CODECS.incrementaldecoder(
+                        self._enc_in)(errors=self.encoding_errors)
+                self._decoder._encoding = self._enc_in
             except LookupError as err:
-                assert (self.encoding(incoming=True)
-                        != self._default_encoding), err
+                assert self._enc_in != self._default_encoding, err
                 self.log.info(err)
                 self._env_update({'CHARSET': self._default_encoding})
-                self._decoder = codecs.getincrementaldecoder(
-                        self.encoding(incoming=True))(
-                        errors=self.encoding_errors)
-                self._decoder._encoding = self.encoding(incoming=True)
+                self._cache_codecs()
+                self._decoder = charset.CODECS.incrementaldecoder(
+                        self._enc_in)(errors=self.encoding_errors)
+                self._decoder._encoding = self._enc_in
                 # interupt client session to notify change of encoding,
                 self._display_charset_err(err)
                 self.display_prompt()
-        return self._decoder.decode(input, final)
+        ucs = self._decoder.decode(input, final)
+        self._decoder_partial = bool(self._decoder.getstate()[0])
+        return ucs
+
+    def _cache_codecs(self):
+        """ Cache negotiated input and output encoding, see ``encoding()``.
+        """
+        self._enc_in = self.encoding(incoming=True)
+        self._enc_out = self.encoding(outgoing=True)
+        self._ascii_in = charset.CODECS.ascii_compatible(self._enc_in)
+        self._ascii_out = charset.CODECS.ascii_compatible(self._enc_out)
+        codec = charset.CODECS.lookup(self._enc_out)
+        self.stream.output_utf8 = codec is not None and codec.name == 'utf-8'
+
+    def _option_changed(self, opt, value):
+        """ Callback for change of local or remote option ``opt``. """
+        if opt == telopt.BINARY:
+            self._enc_in = self._enc_out = None
 
     def _display_charset_err(self, err):
+        self._flush_echo()
+        if self._screen is not None:
+            self._screen.invalidate()
         self.stream.write(b'\r\n')
         self.stream.write(bytes(
             err.args[0].encode(
@@ -744,11 +1484,75 @@ class TelnetServer(tulip.protocols.Protocol):
             ``line_received`` callback.
         """
         self.transport = transport
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
         self.stream = telopt.TelnetStreamReader(transport, server=True)
+        self.stream.local_option.callback = self._option_changed
+        self.stream.remote_option.callback = self._option_changed
+        if self._xoff_maxsize is not None:
+            self.stream.xoff_maxsize = self._xoff_maxsize
+        if self._xoff_overflow is not None:
+            self.stream.xoff_overflow = self._xoff_overflow
+        if self._scheduler is not None:
+            self.stream.scheduler = self._scheduler
+            self.stream.drain_callback = self._output_drained
         self._last_received = datetime.datetime.now()
         self._connected = datetime.datetime.now()
         self._retval = 0
+        if self._fingerprints is not None:
+            self.stream.reply_log = bytearray()
+        if self._resolver is not None:
+            self._resolve()
+        self._urgent_fd = _urgent_inline(transport)
         self.set_callbacks()
+        if self._admission is not None:
+            self._admit()
+        else:
+            self._admitted = self._connected
+            self.banner()
+            self._negotiate()
+
+    def _resolve(self):
+        """ Begin reverse dns lookup of remote address, without waiting;
+            it is usually complete before negotiation.
+        """
+        addr = self.peername[0]
+        self._hostname = self._resolver.cached(addr)
+        if self._hostname is None:
+            def resolved(future):
+                self._hostname = future.result()
+                self.log.debug('{} is {}'.format(addr, self._hostname))
+            self._resolver.lookup(self._loop, addr).add_done_callback(
+                resolved)
+
+    def _admit(self, retry=False):
+        """ Request admission of session from ``AdmissionControl``.
+
+            When admitted, ``banner()`` and ``_negotiate()`` are fired. When
+            deferred, reading is paused and admission is retried after
+            ``DEFER_INTERVAL``. When rejected, the connection is closed.
+        """
+        if self._closing:
+            return
+        verdict = self._admission.admit(
+                self.peername[0], waited=self.duration if retry else 0.0)
+        if verdict == admission.DEFER:
+            if not retry and hasattr(self.transport, 'pause_reading'):
+                self.transport.pause_reading()
+            self._loop.call_later(
+                    self._admission.DEFER_INTERVAL, self._admit, True)
+            return
+        if retry and hasattr(self.transport, 'resume_reading'):
+            self.transport.resume_reading()
+        if verdict == admission.REJECT:
+            self.log.info('{}: admission rejected, {}.'.format(
+                self.about_connection(), self._admission))
+            self.stream.write(b'Too many connections, try again later.\r\n')
+            self.stream.drain_output()
+            self.transport.close()
+            return
+        self._admit_state = 'negotiating'
+        self._admitted = datetime.datetime.now()
         self.banner()
         self._negotiate()
 
@@ -766,13 +1570,15 @@ class TelnetServer(tulip.protocols.Protocol):
         identified, or at least all possible (Kermit claims 30) ttypes are
         logged.
         """
-        self.stream.iac(telopt.DO, telopt.LINEMODE)
-        self.stream.iac(telopt.WILL, telopt.STATUS)
-        self.stream.iac(telopt.WILL, telopt.LFLOW)
-        self.stream.iac(telopt.DO, telopt.NEW_ENVIRON)
-        self.stream.iac(telopt.DO, telopt.NAWS)
-        self.stream.iac(telopt.DO, telopt.CHARSET)
-        self.stream.iac(telopt.DO, telopt.TTYPE)
+        plan = self.advanced_plan
+        if self._fingerprinted is not None:
+            # skip options this kind of client has refused, or ignored.
+            outcomes = self._fingerprinted['options']
+            plan = tuple((cmd, opt) for cmd, opt in plan
+                         if outcomes.get(telopt._name_commands(cmd + opt))
+                         not in (fingerprint.FingerprintCache.REFUSED,
+                                 fingerprint.FingerprintCache.UNANSWERED))
+        self.stream.iac_plan(plan)
         if ttype and self.stream.remote_option.enabled(telopt.TTYPE):
             # we've already accepted their ttype, but see what else they have!
             self.stream.request_ttype()
@@ -793,9 +1599,11 @@ class TelnetServer(tulip.protocols.Protocol):
                 self.encoding(outgoing=True)
                 == self.encoding(incoming=True) else ' in, {} out'
                 .format(self.encoding(outgoing=True)))
-        origin = '{0}:{1}'.format(
-                *self.transport.get_extra_info('addr', ('unknown', -1,)))
-        self.echo('\r\nConnected {}s ago from {}.'
+        lines = []
+        origin = '{0}:{1}'.format(*self.peername)
+        if self._hostname is not None:
+            origin = '{} ({})'.format(self._hostname, origin)
+        lines.append('\r\nConnected {}s ago from {}.'
             '\r\nLinemode is {}.'
             '\r\nFlow control is {}.'
             '\r\nEncoding is {}.'
@@ -803,11 +1611,13 @@ class TelnetServer(tulip.protocols.Protocol):
                 self.bold('{:0.3f}'.format(self.duration)),
                 (origin
                     if not origin.startswith('127.0.0.1:')
+                    and '(127.0.0.1:' not in origin
                     else self.bold(origin)),
                 (self.standout(self.stream.linemode.__str__().rstrip('|ack'))
                     if self.stream.is_linemode
                     else self.bold('kludge')),
-                (self.bold('xon-any') if self.stream.xon_any
+                (self.bold('off') if not self.stream.lflow
+                    else self.bold('xon-any') if self.stream.xon_any
                     else 'xon'),
                 (encoding if encoding == 'ascii'
                     else self.standout(encoding)),
@@ -820,6 +1630,41 @@ class TelnetServer(tulip.protocols.Protocol):
                         != self.default_env['LINES']
                     else self.env['LINES']),
                 ))
+        for name, runner in sorted(self._executors.items()):
+            lines.append('\r\n{}: {}.'.format(name, runner))
+        if self.stream.xoff_peak or self.stream.ao_discarded:
+            lines.append('\r\nOutput queued {} bytes at most, {} discarded '
+                         'by XOFF, {} by AO.'.format(
+                             self.stream.xoff_peak,
+                             self.stream.xoff_discarded,
+                             self.stream.ao_discarded))
+        if self.stream.control_ahead:
+            lines.append('\r\n{} negotiation commands sent ahead of queued '
+                         'output.'.format(self.stream.control_ahead))
+        if self._srtt is not None:
+            lines.append('\r\nRound-trip time is {:0.1f}ms, jitter {:0.1f}ms.'
+                         .format(self._srtt * 1000, self._rttvar * 1000))
+        if self._rtt_stats is not None:
+            lines.append('\r\nRound-trip times: {}.'.format(self._rtt_stats))
+        if self._resolver is not None:
+            lines.append('\r\nResolver: {}.'.format(self._resolver))
+        if self._pastes or self._throttled:
+            lines.append('\r\nInput pasted {} times, throttled {} times.'
+                         .format(self._pastes, self._throttled))
+        if self._cmd_quota is not None:
+            lines.append('\r\nCommand quota: {}.'.format(self._cmd_quota))
+        if self._scheduler is not None:
+            lines.append('\r\nOutput scheduler: {}.'.format(
+                self._scheduler))
+        if self._streamed_bytes:
+            lines.append('\r\nStreamed {} bytes in {:0.3f}s ({:0.1f} kB/s).'
+                         .format(self._streamed_bytes, self._streamed_time,
+                                 self._streamed_bytes / max(
+                                     self._streamed_time, 1e-6) / 1024))
+        if self._screen is not None and self._screen.redraws:
+            lines.append('\r\nLine redraw: {}.'.format(self._screen))
+        lines.append('\r\nCodecs: {}.'.format(charset.CODECS))
+        self.page(''.join(lines).split('\r\n')[1:])
 
     def logout(self, opt=telopt.DO):
         if opt != telopt.DO:
@@ -831,16 +1676,100 @@ class TelnetServer(tulip.protocols.Protocol):
                 'Echoing screams fill the wastelands as you close your eyes',
                 'Your very soul aches as you wake up from your favorite dream')
         self.echo('\r\n{}.\r\n'.format(msgs[int(time.time()/84) % len(msgs)]))
+        self.stream.drain_output()
         self.transport.close()
 
     def eof_received(self):
         self._closing = True
+        if self.reader is not None:
+            self.reader.feed_eof()
 
     def connection_lost(self, exc):
         self._closing = True
+        self.cancel_cmd()
+        self.stream.close()
+        if self._rtt_timer is not None:
+            self._rtt_timer.cancel()
+            self._rtt_timer = None
+        if self._input_timer is not None:
+            self._input_timer.cancel()
+            self._input_timer = None
+        if self.reader is not None:
+            self.reader.feed_eof()
+        self.resume_writing()
+        if self._admit_state is not None:
+            self._admission.release(self.peername[0],
+                    negotiating=(self._admit_state == 'negotiating'))
+            self._admit_state = None
         self.log.info('{}{}'.format(self.about_connection(),
             ': {}'.format(exc) if exc is not None else ''))
 
+    def pause_writing(self):
+        """ Called by transport when its buffer exceeds the high-water
+            mark; ``TelnetWriter.drain()`` waits until resumed, and further
+            output is queued by the stream, where AO may discard it.
+        """
+        self._write_paused = True
+        self.stream.pause_output()
+
+    def resume_writing(self):
+        """ Called by transport when its buffer drains below the
+            low-water mark, waking any ``TelnetWriter.drain()``.
+        """
+        self._write_paused = False
+        if not self._closing:
+            self.stream.resume_output()
+        if not self._write_paused and self.stream.xmit:
+            self._wake_drain()
+
+    def _wake_drain(self):
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _output_drained(self):
+        """ Callback when output queued by the stream's ``scheduler`` is
+            written, waking any ``TelnetWriter.drain()``.
+        """
+        if not self._write_paused and self.stream.xmit:
+            self._wake_drain()
+
+    def drain_waiter(self):
+        """ Returns future completed when writing is resumed, or None
+            if writing is not paused, by the transport or by XOFF, and no
+            more than ``FLUSH_SIZE`` bytes of output await their turn of
+            the ``scheduler``.
+        """
+        if self._closing or not (
+                self._write_paused or not self.stream.xmit
+                or self.stream.output_queued > self.stream.FLUSH_SIZE):
+            return None
+        if self._drain_waiter is None:
+            if hasattr(self._loop, 'create_future'):
+                self._drain_waiter = self._loop.create_future()
+            else:
+                self._drain_waiter = asyncio.Future(loop=self._loop)
+        return self._drain_waiter
+
+    def xoff_received(self, slc):
+        """ Callback for SLC_XOFF (^S): output is buffered and
+            ``TelnetWriter.drain()`` waits until XON is received.
+        """
+        self.stream.handle_xoff(slc)
+
+    def xon_received(self, slc):
+        """ Callback for SLC_XON (^Q), or any key when ``xon_any``: the
+            output buffered since XOFF is sent, and writing resumes.
+        """
+        self.stream.handle_xon(slc)
+        if not self._write_paused:
+            self._wake_drain()
+
+    @property
+    def is_closing(self):
+        """ True if connection is closing or lost. """
+        return self._closing
+
     def set_callbacks(self):
         """ XXX Register callbacks with TelnetStreamReader
 
@@ -852,6 +1781,10 @@ class TelnetServer(tulip.protocols.Protocol):
         self.stream.set_iac_callback(telopt.AYT, self.handle_ayt)
         self.stream.set_slc_callback(telopt.SLC_AYT, self.handle_ayt)
 
+        # wire flow control XOFF (^S) and XON (^Q) to pause output
+        self.stream.set_slc_callback(telopt.SLC_XOFF, self.xoff_received)
+        self.stream.set_slc_callback(telopt.SLC_XON, self.xon_received)
+
         # wire various 'interrupts', such as AO, IP to ``interrupt_received``
         self.stream.set_iac_callback(telopt.AO, self.interrupt_received)
         self.stream.set_iac_callback(telopt.IP, self.interrupt_received)
@@ -863,11 +1796,13 @@ class TelnetServer(tulip.protocols.Protocol):
         self.stream.set_ext_callback(telopt.NEW_ENVIRON, self._env_update)
         self.stream.set_ext_callback(telopt.TTYPE, self.ttype_received)
         self.stream.set_ext_callback(telopt.NAWS, self._naws_update)
+        self.stream.set_ext_callback(telopt.TM, self.timing_mark_received)
+        self.stream.set_ext_callback(telopt.CHARSET, self._charset_received)
 
     def cmdset_help(self, *args):
         if not len(args):
-            self.echo('\r\nAvailable commands:\r\n')
-            self.echo(', '.join(self.cmdset_autocomplete.keys()))
+            self.page(['Available commands:',
+                       ', '.join(self.cmdset_autocomplete.keys())])
             return 0
         cmd = args[0].lower()
         if cmd == 'help':
@@ -973,10 +1908,9 @@ class TelnetServer(tulip.protocols.Protocol):
                 return 0
             return -1  # variable not found, -1
         # display all values
-        self.echo('\r\n')
-        self.echo('\r\n'.join(['{}{}{}'.format(
+        self.page([''] + ['{}{}{}'.format(
             _key, self.dim('='), disp_kv(_key, _val))
-            for (_key, _val) in sorted(self.env.items())]))
+            for (_key, _val) in sorted(self.env.items())])
         return 0
 
     def cmdset_assign(self, *args):
@@ -1012,6 +1946,19 @@ class TelnetServer(tulip.protocols.Protocol):
             # track TTYPE seperately from the NEW_ENVIRON 'TERM' value to
             # avoid telnet loops in TTYPE cycling
             self._env_update({'TTYPE0': ttype})
+            if self._fingerprints is not None:
+                self._fingerprint = self._fingerprint_key(ttype)
+                self._fingerprinted = self._fingerprints.get(
+                        self._fingerprint)
+            if self._fingerprinted is not None:
+                # a known client, its TTYPE cycle need not be repeated.
+                for key, value in sorted(self._fingerprinted['env'].items()):
+                    self._env_update({key: value})
+                self.log.debug('fingerprint known: {}'.format(
+                    self._fingerprint))
+                self.request_advanced_opts(ttype=False)
+                self._advanced = 1
+                return
             # windows-98 era telnet ('ansi'), or terminals replying as
             # such won't have anything more interesting to say. windows
             # socket transport locks up if a second TTYPE is requested.
@@ -1048,6 +1995,39 @@ class TelnetServer(tulip.protocols.Protocol):
         self.stream.request_ttype()
         self._advanced += 1
 
+    def _fingerprint_key(self, ttype):
+        """ Returns fingerprint of client, the ordered replies received
+            to negotiation of ``banner()``, and first TTYPE ``ttype``.
+        """
+        replies = self.stream.reply_log
+        self.stream.reply_log = None
+        return '{}|{}'.format(ttype, ','.join(
+            telopt._name_commands(replies[idx:idx + 2])
+            for idx in range(0, len(replies), 2)))
+
+    def _fingerprint_outcome(self):
+        """ Returns record of negotiation outcome of this client, the
+            result of each option of ``advanced_plan``, and environment
+            values learned by TTYPE cycling, for ``FingerprintCache``.
+        """
+        cache, stream = fingerprint.FingerprintCache, self.stream
+        outcomes = dict()
+        for cmd, opt in self.advanced_plan:
+            option = (stream.remote_option if cmd in (telopt.DO, telopt.DONT)
+                      else stream.local_option)
+            if stream.pending_option.enabled(cmd + opt):
+                outcome = cache.UNANSWERED
+            elif opt in option:
+                outcome = (cache.ACCEPTED if option.enabled(opt)
+                           else cache.REFUSED)
+            else:
+                continue
+            outcomes[telopt._name_commands(cmd + opt)] = outcome
+        env = dict((key, value) for key, value in self.env.items()
+                   if key == 'TERM' or key.startswith('TTYPE')
+                   and key != 'TTYPE0')
+        return {'options': outcomes, 'env': env}
+
     def _display_tb(self, *exc_info, level=logging.DEBUG):
         """ Dispaly exception to client when ``show_traceback`` is True,
             forward copy server log at debug and info levels.
@@ -1082,10 +2062,19 @@ class TelnetServer(tulip.protocols.Protocol):
         else:
             self._client_env.update(env)
             self.log.debug('env_update: %r', env)
+            if self._pager is not None and ('COLUMNS' in env
+                                            or 'LINES' in env):
+                self._pager.resize(*self._window_size())
+            if 'CHARSET' in env:
+                self._enc_in = self._enc_out = None
 
-    def _charset_received(self, charset):
+    def _charset_received(self, name):
         " Callback receives CHARSET value, rfc2066 "
-        self._env_update({'CHARSET': charset.lower()})
+        if charset.CODECS.lookup(name) is None:
+            self.log.info('CHARSET {!r} accepted by client is unknown, '
+                          'remaining {!r}.'.format(name, self.env['CHARSET']))
+            return
+        self._env_update({'CHARSET': name.lower()})
 
     def _naws_update(self, width, height):
         " Callback receives NAWS values, rfc1073 "
@@ -1115,18 +2104,68 @@ class TelnetServer(tulip.protocols.Protocol):
         assert callable(call_after), call_after
         if self._closing:
             return
-        loop = tulip.get_event_loop()
         pending = [telopt._name_commands(opt)
                 for (opt, val) in self.stream.pending_option.items()
                 if val]
-        if self.duration < self.CONNECT_MINWAIT or (
-                pending and self.duration < self.CONNECT_MAXWAIT):
-            loop.call_later(self.CONNECT_DEFERED, self._negotiate, call_after)
+        elapsed = (datetime.datetime.now() - self._admitted).total_seconds()
+        if elapsed < self.CONNECT_MINWAIT or (
+                pending and elapsed < self.CONNECT_MAXWAIT):
+            self._loop.call_later(
+                    self.CONNECT_DEFERED, self._negotiate, call_after)
             return
         elif pending:
             self.log.warn('negotiate failed for {}.'.format(pending))
             self.echo('\r\nnegotiate failed for {}.'.format(pending))
-        loop.call_soon(call_after)
+        if self._admit_state == 'negotiating':
+            self._admission.negotiated()
+            self._admit_state = 'negotiated'
+        if self._fingerprint is not None and self._fingerprinted is None:
+            self._fingerprinted = self._fingerprint_outcome()
+            self._fingerprints.store(self._fingerprint, self._fingerprinted)
+        self._loop.call_soon(call_after)
+
+if hasattr(str, 'isascii'):
+    def _isascii(buf):
+        """ Returns True if ``buf``, str or bytes, is 7-bit ascii. """
+        return buf.isascii()
+else:
+    def _isascii(buf):
+        """ Always False before python 3.7, disabling ascii fast path. """
+        return False
+
+#: ioctl request of sockatmark(3), True when the next byte read from a
+#  socket is urgent data, by platform.
+SIOCATMARK = (0x8905 if sys.platform.startswith('linux') else 0x40047307
+              if sys.platform.startswith(('darwin', 'freebsd', 'openbsd',
+                                          'netbsd')) else None)
+
+def _urgent_inline(transport):
+    """ Set SO_OOBINLINE on socket of ``transport``, so that urgent data
+        ("Synch") is received in-band. Returns its file descriptor, tested
+        by ``_sockatmark()``, or None if urgent data cannot be detected.
+    """
+    sock = transport.get_extra_info('socket')
+    if sock is None or fcntl is None or SIOCATMARK is None:
+        return None
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_OOBINLINE, 1)
+    except OSError:
+        return None
+    return sock.fileno()
+
+def _sockatmark(fd):
+    """ Returns True if file descriptor ``fd`` is at the urgent mark. """
+    try:
+        return bool(struct.unpack('i', fcntl.ioctl(
+            fd, SIOCATMARK, b'\x00' * 4))[0])
+    except OSError:
+        return False
+
+def _whereami(sockname):
+    """ Returns fully qualified domain name and port of ``sockname``,
+        of the local end of a connection, by (blocking) dns lookup.
+    """
+    return '{}:{}'.format(socket.getfqdn(sockname[0]), sockname[1])
 
 ARGS = argparse.ArgumentParser(description="Run simple telnet server.")
 ARGS.add_argument(
@@ -1138,6 +2177,88 @@ ARGS.add_argument(
 ARGS.add_argument(
     '--loglevel', action="store", dest="loglevel",
     default='info', type=str, help='Loglevel (debug,info)')
+ARGS.add_argument(
+    '--loop', action="store", dest="loop",
+    default='asyncio', type=str, help='Event loop (asyncio,uvloop)')
+ARGS.add_argument(
+    '--backlog', action="store", dest="backlog",
+    default=100, type=int, help='Listen backlog, and accepts per wakeup')
+ARGS.add_argument(
+    '--max-negotiating', action="store", dest="max_negotiating",
+    default=None, type=int, help='Sessions negotiating before deferral')
+ARGS.add_argument(
+    '--max-per-ip', action="store", dest="max_per_ip",
+    default=None, type=int, help='Concurrent sessions per remote address')
+ARGS.add_argument(
+    '--rate-per-ip', action="store", dest="rate_per_ip",
+    default=None, type=float, help='New sessions per second per address')
+ARGS.add_argument(
+    '--fingerprints', action="store_true", dest="fingerprints",
+    default=False, help='Cache negotiation outcome of known clients')
+ARGS.add_argument(
+    '--fingerprint-file', action="store", dest="fingerprint_file",
+    default=None, type=str, help='Persist fingerprint cache to file')
+ARGS.add_argument(
+    '--rtt-interval', action="store", dest="rtt_interval",
+    default=None, type=float, help='Seconds between round-trip time probes')
+ARGS.add_argument(
+    '--input-rate', action="store", dest="input_rate",
+    default=65536, type=int, help='Input bytes per second per session')
+ARGS.add_argument(
+    '--commands-per-tick', action="store", dest="commands_per_tick",
+    default=64, type=int, help='Commands processed per loop iteration')
+ARGS.add_argument(
+    '--output-quantum', action="store", dest="output_quantum",
+    default=2 ** 14, type=int,
+    help='Output bytes per session per loop iteration, when others wait')
+ARGS.add_argument(
+    '--resolve', action="store_true", dest="resolve",
+    default=False, help='Reverse dns lookup of client addresses')
+ARGS.add_argument(
+    '--xoff-buffer', action="store", dest="xoff_buffer",
+    default=telopt.TelnetStreamReader.XOFF_MAXSIZE, type=int,
+    help='Output buffered per session while stopped by XOFF')
+ARGS.add_argument(
+    '--xoff-overflow', action="store", dest="xoff_overflow",
+    default=telopt.TelnetStreamReader.XOFF_OVERFLOW, type=str,
+    choices=('discard', 'truncate', 'close'),
+    help='When XOFF buffer is full: discard new output, truncate old '
+         'output, or close')
+ARGS.add_argument(
+    '--executor-threads', action="store", dest="executor_threads",
+    default=4, type=int, help='Workers for blocking commands (0=inline)')
+ARGS.add_argument(
+    '--executor-processes', action="store", dest="executor_processes",
+    default=0, type=int, help='Workers for cpu-heavy commands (0=none)')
+
+def new_event_loop(name='asyncio'):
+    """ .. function::new_event_loop(name : string) -> event loop
+
+        Returns a new event loop of implementation ``name``, 'asyncio'
+        for the standard library (or bundled tulip) loop, or any other
+        asyncio-compatible loop module providing ``new_event_loop()``,
+        such as 'uvloop'.
+    """
+    if name == 'asyncio':
+        return asyncio.new_event_loop()
+    import importlib
+    return importlib.import_module(name).new_event_loop()
+
+def start_server(loop, protocol_factory, host, port, backlog=100):
+    """ .. function::start_server(loop, protocol_factory, host, port,
+                                    backlog=100) -> list
+
+        Begin serving ``protocol_factory`` on ``host`` and ``port`` using
+        ``loop.create_server()``, or ``loop.start_serving()`` of the bundled
+        tulip loop. Returns list of listening sockets. Both loops accept up
+        to ``backlog`` connections for each wakeup of a listening socket.
+    """
+    if hasattr(loop, 'create_server'):
+        server = loop.run_until_complete(loop.create_server(
+            protocol_factory, host, port, backlog=backlog))
+        return server.sockets
+    return loop.run_until_complete(loop.start_serving(
+        protocol_factory, host, port, backlog=backlog))
 
 def main():
     import logging
@@ -1156,13 +2277,50 @@ def main():
     log.setLevel(getattr(logging, log_const))
     log.debug('default_encoding is {}'.format(enc))
 
-    loop = tulip.get_event_loop()
-    func = loop.start_serving(lambda: TelnetServer(default_encoding=enc),
-            args.host, args.port)
-
-    for sock in loop.run_until_complete(func):
+    loop = new_event_loop(args.loop)
+    asyncio.set_event_loop(loop)
+    log.debug('event loop is {}'.format(loop.__class__.__name__))
+    admit = None
+    if (args.max_negotiating is not None or args.max_per_ip is not None
+            or args.rate_per_ip is not None):
+        admit = admission.AdmissionControl(
+                max_negotiating=args.max_negotiating,
+                max_per_ip=args.max_per_ip,
+                rate_per_ip=args.rate_per_ip)
+    fingerprints = None
+    if args.fingerprints or args.fingerprint_file is not None:
+        fingerprints = fingerprint.FingerprintCache(
+                filename=args.fingerprint_file)
+    executors = {executor.INLINE: executor.CommandExecutor(executor.INLINE)}
+    if args.executor_threads:
+        executors[executor.THREAD] = executor.CommandExecutor(
+                executor.THREAD, max_workers=args.executor_threads)
+    if args.executor_processes:
+        executors[executor.PROCESS] = executor.CommandExecutor(
+                executor.PROCESS, max_workers=args.executor_processes)
+    resolve = resolver.Resolver() if args.resolve else None
+    rtt_stats = timing.RoundTripStats()
+    quota = (throttle.CommandQuota(per_tick=args.commands_per_tick)
+             if args.commands_per_tick else None)
+    output = (scheduler.OutputScheduler(loop, quantum=args.output_quantum)
+              if args.output_quantum else None)
+    for sock in start_server(loop,
+            lambda: TelnetServer(
+                default_encoding=enc, loop=loop, admission=admit,
+                fingerprints=fingerprints, executors=executors,
+                resolver=resolve, xoff_maxsize=args.xoff_buffer,
+                xoff_overflow=args.xoff_overflow, rtt_stats=rtt_stats,
+                rtt_interval=args.rtt_interval, input_rate=args.input_rate,
+                cmd_quota=quota, scheduler=output),
+            args.host, args.port, args.backlog):
         logging.info('Listening on %s', sock.getsockname())
-    loop.run_forever()
+    try:
+        loop.run_forever()
+    finally:
+        if fingerprints is not None:
+            fingerprints.save()
+        for runner in executors.values():
+            runner.shutdown(wait=False)
 
 if __name__ == '__main__':
     main()
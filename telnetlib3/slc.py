@@ -6,6 +6,11 @@ theNULL = bytes([0])
 (SLC_FLUSHOUT, SLC_FLUSHIN, SLC_ACK) = (
         bytes([32]), bytes([64]), bytes([128]))
 SLC_LEVELBITS = 0x03
+#: SLC levels and flag bits as integers, for use with ``SLC_tab``.
+(LEVEL_NOSUPPORT, LEVEL_CANTCHANGE, LEVEL_VARIABLE, LEVEL_DEFAULT) = range(4)
+(FLAG_FLUSHOUT, FLAG_FLUSHIN, FLAG_ACK) = (32, 64, 128)
+#: each single byte, indexed by value, to avoid allocating ``bytes([n])``.
+_BYTES = tuple(bytes([num]) for num in range(256))
 
 NSLC = 30
 (SLC_SYNCH, SLC_BRK, SLC_IP, SLC_AO, SLC_AYT, SLC_EOR, SLC_ABORT, SLC_EOF,
@@ -15,6 +20,8 @@ NSLC = 30
             bytes([const]) for const in range(1, NSLC + 1))
 
 class SLC_definition(object):
+    __slots__ = ('mask', 'val')
+
     def __init__(self, mask=SLC_DEFAULT, value=theNULL):
         """ .. class:SLC_definition(mask : byte, value: byte)
 
@@ -34,7 +41,7 @@ class SLC_definition(object):
     @property
     def level(self):
         """ Returns SLC level of support.  """
-        return bytes([ord(self.mask) & SLC_LEVELBITS])
+        return _BYTES[ord(self.mask) & SLC_LEVELBITS]
 
     @property
     def nosupport(self):
@@ -92,20 +99,11 @@ class SLC_definition(object):
 
     def __str__(self):
         """ SLC definition as string '(flag(|s), value)'. """
-        flags = []
-        if self.nosupport:
-            flags.append('nosupport')
-        if self.ack:
-            flags.append('ack')
-        if self.flushin:
-            flags.append('flushin')
-        if self.flushout:
-            flags.append('flushout')
-        return '({}, {})'.format(
-                '|'.join(flags) if flags else 'None',
-                name_unicode(self.val.decode('iso8859-1')))
+        return describe_slc(ord(self.mask), ord(self.val))
 
 class SLC_nosupport(SLC_definition):
+    __slots__ = ()
+
     def __init__(self):
         """ .. class:SLC_nosupport()
 
@@ -115,7 +113,116 @@ class SLC_nosupport(SLC_definition):
         """
         SLC_definition.__init__(self, SLC_NOSUPPORT, _POSIX_VDISABLE)
 
+class SLC_view(SLC_definition):
+    __slots__ = ('_tab', '_func')
+
+    def __init__(self, tab, func):
+        """ .. class:SLC_view(tab : SLC_tab, func : int)
+
+            SLC definition of function ``func`` stored in SLC_tab ``tab``;
+            its ``mask`` and ``val`` read from, and write to, the table.
+        """
+        self._tab, self._func = tab, func
+
+    @property
+    def mask(self):
+        return _BYTES[self._tab.flags[self._func]]
+
+    @mask.setter
+    def mask(self, mask):
+        self._tab.flags[self._func] = ord(mask)
+
+    @property
+    def val(self):
+        return _BYTES[self._tab.values[self._func]]
+
+    @val.setter
+    def val(self, value):
+        self._tab.values[self._func] = ord(value)
+
+class SLC_tab(object):
+    __slots__ = ('flags', 'values')
+
+    def __init__(self, tabset=None):
+        """ .. class:SLC_tab(tabset : dict)
+
+            Compact table of Special Linemode Character definitions for
+            each SLC function, 0 through NSLC, stored as two bytearrays of
+            integer ``flags`` (level and flag bits) and ``values``, indexed
+            by function. Functions not found in ``tabset``, a dictionary of
+            SLC function bytes to SLC_definition instances, are defined as
+            ``SLC_nosupport()``.
+
+            Items are accessed as ``SLC_view`` instances, keyed by function
+            byte or integer.
+        """
+        self.flags = bytearray([LEVEL_NOSUPPORT]) * (NSLC + 1)
+        self.values = bytearray(_POSIX_VDISABLE) * (NSLC + 1)
+        for func, slc_def in (tabset or {}).items():
+            self.set(ord(func), ord(slc_def.mask), ord(slc_def.val))
+
+    def copy(self):
+        """ .. method::copy() -> SLC_tab
+
+            Returns a copy of this table.
+        """
+        tab = SLC_tab.__new__(SLC_tab)
+        tab.flags, tab.values = bytearray(self.flags), bytearray(self.values)
+        return tab
+
+    def set(self, func, flags, value):
+        """ .. method::set(func : int, flags : int, value : int)
+
+            Set SLC definition of function ``func``.
+        """
+        self.flags[func] = flags
+        self.values[func] = value
+
+    def level(self, func):
+        """ .. method::level(func : int) -> int
+
+            Returns SLC level of support of function ``func``.
+        """
+        return self.flags[func] & SLC_LEVELBITS
+
+    def nosupport(self, func):
+        """ .. method::nosupport(func : int) -> bool
+
+            Returns True if SLC level of function ``func`` is SLC_NOSUPPORT.
+        """
+        return self.flags[func] & SLC_LEVELBITS == LEVEL_NOSUPPORT
+
+    def find(self, value):
+        """ .. method::find(value : int) -> int
+
+            Returns the first SLC function of keyboard ascii ``value``,
+            or -1 if not found. No function matches value 0.
+        """
+        return self.values.find(value) if value else -1
+
+    def items(self):
+        """ .. method::items() -> iterable
+
+            Yields tuples (function byte, SLC_view) of all SLC functions.
+        """
+        for func in range(NSLC + 1):
+            yield _BYTES[func], SLC_view(self, func)
+
+    def __getitem__(self, func):
+        """ Returns SLC_view of function ``func``, byte or integer. """
+        return SLC_view(self, func if isinstance(func, int) else ord(func))
+
+    def __setitem__(self, func, slc_def):
+        """ Set function ``func``, byte or integer, to ``slc_def``. """
+        self.set(func if isinstance(func, int) else ord(func),
+                 ord(slc_def.mask), ord(slc_def.val))
+
+    def __len__(self):
+        return NSLC + 1
+
 class Forwardmask(object):
+    __slots__ = ('value', 'ack')
+
     def __init__(self, value, ack=False):
         """ .. class:: ForwardMask(value : bytes, ack: bool)
 
@@ -171,9 +278,13 @@ class Forwardmask(object):
         """ .. method:: __contains__(number : int) -> type(bool)
 
             ``True`` if forwardmask has keycode ``number``, else ``False``.
+            ``number`` may also be given as a single byte.
         """
-        mask, flag = number // 8, 2 ** (7 - (number % 8))
-        return bool(self.value[mask] & flag)
+        if not isinstance(number, int):
+            number = ord(number)
+        mask = number // 8
+        return (mask < len(self.value)
+                and bool(self.value[mask] & (0x80 >> (number % 8))))
 
 #: SLC value may be changed, flushes input and output
 _SLC_VARIABLE_FIO = bytes(
@@ -236,8 +347,26 @@ _DEBUG_SLC_OPTS = dict([(value, key)
                             'SLC_OVER', 'SLC_ECR', 'SLC_EWR', 'SLC_EBOL',
                             'SLC_EEOL',)])
 
+def describe_slc(flags, value):
+    """ Given integer SLC ``flags`` and ``value``, return string describing
+        the definition as '(flag(|s), value)'.
+    """
+    names = []
+    if flags & SLC_LEVELBITS == LEVEL_NOSUPPORT:
+        names.append('nosupport')
+    if flags & FLAG_ACK:
+        names.append('ack')
+    if flags & FLAG_FLUSHIN:
+        names.append('flushin')
+    if flags & FLAG_FLUSHOUT:
+        names.append('flushout')
+    return '({}, {})'.format('|'.join(names) if names else 'None',
+                             name_unicode(chr(value)))
+
 def name_slc_command(byte):
     """ Given an SLC byte, return global mnumonic constant as string. """
+    if isinstance(byte, int):
+        byte = _BYTES[byte]
     return (repr(byte) if byte not in _DEBUG_SLC_OPTS
             else _DEBUG_SLC_OPTS[byte])
 
@@ -1,5 +1,7 @@
 import collections
 import logging
+import socket
+import re
 
 from telnetlib import LINEMODE, NAWS, NEW_ENVIRON, BINARY, SGA, ECHO, STATUS
 from telnetlib import TTYPE, TSPEED, LFLOW, XDISPLOC, IAC, DONT, DO, WONT
@@ -15,14 +17,21 @@ from slc import SLC_FORW2, SLC_MCL, SLC_MCR, SLC_MCWL, SLC_MCWR, SLC_MCBOL
 from slc import SLC_MCEOL, SLC_INSRT, SLC_OVER, SLC_ECR, SLC_EWR, SLC_EBOL
 from slc import SLC_EEOL, DEFAULT_SLC_TAB, SLC_nosupport, SLC_definition
 from slc import _POSIX_VDISABLE, name_slc_command, Forwardmask
+from slc import SLC_LEVELBITS, LEVEL_NOSUPPORT, LEVEL_CANTCHANGE
+from slc import LEVEL_VARIABLE, LEVEL_DEFAULT, FLAG_ACK, SLC_tab
+from slc import describe_slc
 
 from teldisp import name_unicode
+from charset import CODECS
 
 (EOF, SUSP, ABORT, EOR_CMD) = (
         bytes([const]) for const in range(236, 240))
 (IS, SEND, INFO) = (bytes([const]) for const in range(3))
 (LFLOW_OFF, LFLOW_ON, LFLOW_RESTART_ANY, LFLOW_RESTART_XON) = (
         bytes([const]) for const in range(4))
+(CHARSET_REQUEST, CHARSET_ACCEPTED, CHARSET_REJECTED, CHARSET_TTABLE_IS,
+    CHARSET_TTABLE_REJECTED, CHARSET_TTABLE_ACK, CHARSET_TTABLE_NAK) = (
+        bytes([const]) for const in range(1, 8))
 (LMODE_MODE, LMODE_FORWARDMASK, LMODE_SLC) = (
         bytes([const]) for const in range(1, 4))
 (LMODE_MODE_REMOTE, LMODE_MODE_LOCAL, LMODE_MODE_TRAPSIG) = (
@@ -30,6 +39,11 @@ from teldisp import name_unicode
 (LMODE_MODE_ACK, LMODE_MODE_SOFT_TAB, LMODE_MODE_LIT_ECHO) = (
     bytes([4]), bytes([8]), bytes([16]))
 
+#: pre-encoded sub-negotiation requests, IAC SB ``opt`` SEND IAC SE
+(_SB_STATUS_SEND, _SB_TSPEED_SEND, _SB_XDISPLOC_SEND, _SB_TTYPE_SEND) = (
+        b''.join([IAC, SB, opt, SEND, IAC, SE])
+        for opt in (STATUS, TSPEED, XDISPLOC, TTYPE))
+
 # see: TelnetStreamReader._default_callbacks
 DEFAULT_IAC_CALLBACKS = (
         (BRK, 'brk'), (IP, 'ip'), (AO, 'ao'), (AYT, 'ayt'), (EC, 'ec'),
@@ -44,7 +58,7 @@ DEFAULT_SLC_CALLBACKS = (
 DEFAULT_EXT_CALLBACKS = (
         (TTYPE, 'ttype'), (TSPEED, 'tspeed'), (XDISPLOC, 'xdisploc'),
         (NEW_ENVIRON, 'env'), (NAWS, 'naws'), (LOGOUT, 'logout'),
-        (SNDLOC, 'sndloc',) )
+        (SNDLOC, 'sndloc',), (TM, 'timing_mark'), (CHARSET, 'charset'), )
 
 def escape_iac(buf):
     """ .. function:: escape_iac(buf : bytes) -> type(bytes)
@@ -56,6 +70,8 @@ def escape_iac(buf):
     return buf.replace(IAC, IAC + IAC)
 
 class Option(dict):
+    __slots__ = ('name', 'log', 'callback')
+
     def __init__(self, name, log=logging):
         """ .. class:: Option(name : str, log: logging.logger)
 
@@ -63,6 +79,9 @@ class Option(dict):
             negotation changes to ``log`` if enabled for debug logging.
         """
         self.name, self.log = name, log
+        #: when set, called with arguments (key, value) for each change
+        #  of an option's value, such as BINARY.
+        self.callback = None
         dict.__init__(self)
 
     def enabled(self, key):
@@ -75,6 +94,10 @@ class Option(dict):
                 for byte in key[:2]] + [repr(byte)
                     for byte in key[2:]])
             self.log.debug('{}[{}] = {}'.format(self.name, descr, value))
+            dict.__setitem__(self, key, value)
+            if self.callback is not None:
+                self.callback(key, value)
+            return
         dict.__setitem__(self, key, value)
     __setitem__.__doc__ = dict.__setitem__.__doc__
 
@@ -89,6 +112,20 @@ class TelnetStreamReader:
        at IAC until  ``is_oob`` tests ``True``, and optionally act on
        functions of ``slc_received``.
    """
+    __slots__ = (
+            'log', 'transport', 'byte_count', 'xon_any', 'iac_received',
+            'slc_received', 'slc_simulated', 'cmd_received', 'pending_option',
+            'local_option', 'remote_option', '_xmit', '_dm_recv',
+            '_sb_buffer', '_slc_buffer', '_linemode', '_default_linemode',
+            '_forwardmask_enabled', '_server', '_iac_callback',
+            '_slc_callback', '_ext_callback', '_slctab', '_slctab_shared',
+            '_default_tabset', '_forwardmask', 'reply_log', 'lflow',
+            'xoff_maxsize', 'xoff_overflow', 'xoff_peak', 'xoff_discarded',
+            'ao_discarded', '_out_queue', '_out_size', '_out_paused',
+            '_synching', '_urgent_sock', '_tm_discard', '_tm_stale',
+            'scheduler', 'drain_callback', '_sched_tick', '_sched_written',
+            '_sched_since', '_sched_deficit', 'control_ahead',
+            'output_utf8', )
 
     #: a list of system environment variables requested by the server after
     # a client agrees to negotiate NEW_ENVIRON.
@@ -97,10 +134,29 @@ class TelnetStreamReader:
             "ACCT JOB PRINTER SFUTLNTVER SFUTLNTMODE LC_ALL VISUAL EDITOR "
             "LC_COLLATE LC_CTYPE LC_MESSAGES LC_MONETARY LC_NUMERIC LC_TIME"
             ).split()
+    #: charsets offered by the server, in order of preference, after a
+    # client agrees to negotiate CHARSET.
+    _default_charset_request = ('UTF-8', 'ISO-8859-1', 'US-ASCII', )
     #: Maximum size of sub-negotiation buffer
     SB_MAXSIZE = 2048
     #: Maximum size of Special Linemode Character receive buffer
     SLC_MAXSIZE = 6 * NSLC
+    #: Default maximum size of output buffered while transmission is
+    #  stopped by XOFF, and policy when exceeded: 'discard' further
+    #  output, 'truncate' the oldest output, or 'close' the connection.
+    XOFF_MAXSIZE = 2 ** 16
+    XOFF_OVERFLOW = 'discard'
+    #: Size of each write of queued output, so that the transport pauses
+    #  writing again before all queued output is given to it.
+    FLUSH_SIZE = 2 ** 14
+    #: default callback method names, keyed by IAC command, SLC function,
+    #  and extended option byte; see ``_default_callbacks``.
+    _default_iac_callback = dict((iac_cmd, 'handle_' + key)
+                                 for iac_cmd, key in DEFAULT_IAC_CALLBACKS)
+    _default_slc_callback = dict((slc_cmd, 'handle_' + key)
+                                 for slc_cmd, key in DEFAULT_SLC_CALLBACKS)
+    _default_ext_callback = dict((ext_cmd, 'handle_' + key)
+                                 for ext_cmd, key in DEFAULT_EXT_CALLBACKS)
 
     @property
     def is_linemode(self):
@@ -138,6 +194,29 @@ class TelnetStreamReader:
         """
         return bool(not self._server)
 
+    @property
+    def xmit(self):
+        """ False while transmission is stopped by receipt of XOFF.
+        """
+        return self._xmit
+
+    @property
+    def output_queued(self):
+        """ Number of bytes of in-band output queued while stopped by XOFF,
+            or while writing is paused by the transport.
+        """
+        return self._out_size
+
+    @property
+    def output_pending(self):
+        """ True if any output, in-band data or IAC commands, is queued.
+        """
+        return bool(self._out_queue)
+
+    @property
+    def _holding(self):
+        return not self._xmit or self._out_paused
+
     @property
     def is_oob(self):
         """ Last byte processed by ``feed_byte()`` should not be received
@@ -145,8 +224,9 @@ class TelnetStreamReader:
             and not inserted into an input buffer.
         """
         # Values matching special linemode characters (SLC) are inband.
-        # Always True if handled by IAC interpreter and any matching callbacks.
-        return (self.iac_received or self.cmd_received)
+        # Always True if handled by IAC interpreter and any matching callbacks,
+        # or when discarded during "Synch", see ``urgent_received()``.
+        return bool(self.iac_received or self.cmd_received or self._synching)
 
     def __init__(self, transport, client=False, server=False, log=logging,
             default_slc_tab=DEFAULT_SLC_TAB):
@@ -174,6 +254,25 @@ class TelnetStreamReader:
         #  of the XON key (Ctrl-q). Or, when unset, any keypress from client
         #  re-enables transmission (XON).
         self.xon_any = False
+        #: whether flow control by XOFF and XON is enabled, toggled by
+        #  receipt of LFLOW_ON and LFLOW_OFF.
+        self.lflow = True
+        #: maximum size of output buffered while stopped by XOFF, and
+        #  policy when exceeded, see ``XOFF_OVERFLOW``.
+        self.xoff_maxsize = self.XOFF_MAXSIZE
+        self.xoff_overflow = self.XOFF_OVERFLOW
+        #: whether in-band output is encoded by utf-8, so that output
+        #  discarded by ``xoff_overflow`` ends at a whole character, rather
+        #  than at any byte, as of a single-byte charset.
+        self.output_utf8 = False
+        #: greatest number of bytes buffered, and number of bytes
+        #  discarded, while stopped by XOFF.
+        self.xoff_peak = 0
+        self.xoff_discarded = 0
+        #: number of bytes discarded by ``discard_output()``
+        self.ao_discarded = 0
+        #: number of IAC negotiation commands sent ahead of queued output
+        self.control_ahead = 0
         #: set ``True`` if the last byte sent to ``feed_byte()`` is the
         #  beginning of an IAC command (\xff).
         self.iac_received = False
@@ -189,16 +288,50 @@ class TelnetStreamReader:
         self.cmd_received = False
         #: True when Flow Control (XON) has been recv until receipt of XOFF.
         self._xmit = True
-        #: Sub-negotiation buffer
-        self._sb_buffer = collections.deque()
-        #: SLC buffer
-        self._slc_buffer = collections.deque()
+        #: True while writing is paused by transport, see ``pause_output()``
+        self._out_paused = False
+        #: True when input is discarded while IAC DO TM is pending, unset
+        #  for probes sent by ``request_timing_mark(discard=False)``.
+        self._tm_discard = True
+        #: count of IAC DO TM expired by ``expire_timing_mark()``, whose
+        #  late replies are ignored.
+        self._tm_stale = 0
+        #: True after urgent data is received, in-band input is discarded
+        #  until IAC DM is received.
+        self._synching = False
+        #: duplicate of the transport's socket, sending urgent data by
+        #  ``send_synch()``, allocated on first use, see ``close()``.
+        self._urgent_sock = None
+        #: Output queue, allocated while stopped by XOFF or paused by the
+        #  transport, of in-band data as unescaped bytearrays, and complete
+        #  IAC commands as bytes, so that ``discard_output()`` may remove
+        #  only in-band data, and truncation never divides a command.
+        self._out_queue = None
+        #: number of bytes of in-band data in ``_out_queue``
+        self._out_size = 0
+        #: ``scheduler.OutputScheduler`` shared by all sessions, if any, by
+        #  which output exceeding its quantum is queued and written in turn.
+        self.scheduler = None
+        #: callable, when set, called after queued output is written, once
+        #  no more than ``FLUSH_SIZE`` bytes remain queued.
+        self.drain_callback = None
+        #: state of ``scheduler``: iteration and bytes written directly in
+        #  it, time of queueing or last turn, and deficit of last turn.
+        self._sched_tick = self._sched_written = self._sched_deficit = 0
+        self._sched_since = None
+        #: Sub-negotiation buffer, allocated on first receipt of IAC SB.
+        self._sb_buffer = None
+        #: SLC buffer, allocated only while sending SLC changes.
+        self._slc_buffer = None
         #: Represents negotiated linemode byte mask if ``is_linemode`` is True.
         self._linemode = Linemode()
         #: True if client acknowledged forwardmask
         self._forwardmask_enabled = False
         #: True if stream is operating in server mode
         self._server = (client in (None, False) or server in (None, True))
+        #: when set to a bytearray, each 2-byte DO, DONT, WILL, or WONT
+        #  command and option received is appended, in order received.
+        self.reply_log = None
 
         self._init_options()
         self._default_callbacks()
@@ -228,12 +361,14 @@ class TelnetStreamReader:
         elif self.iac_received and not self.cmd_received:
             # parse 2nd byte of IAC, even if recv under SB
             self.cmd_received = cmd = byte
-            if cmd not in iac_mbs:
+            if cmd == SB and self._sb_buffer is None:
+                self._sb_buffer = collections.deque()
+            elif cmd not in iac_mbs:
                 # DO, DONT, WILL, WONT are 3-byte commands and
                 # SB can be of any length. Otherwise, this 2nd byte
                 # is the final iac sequence command byte.
-                assert cmd in self._iac_callback, _name_command(cmd)
-                self._iac_callback[cmd](cmd)
+                assert cmd in self._default_iac_callback, _name_command(cmd)
+                self._iac_func(cmd)(cmd)
             self.iac_received = False
 
         elif self.iac_received and self.cmd_received == SB:
@@ -263,7 +398,14 @@ class TelnetStreamReader:
             cmd, opt = self.cmd_received, byte
             self.log.debug('recv IAC {} {}'.format(
                 _name_command(cmd), _name_command(opt)))
-            if cmd == DO:
+            if self.reply_log is not None:
+                self.reply_log.extend(cmd + opt)
+            if cmd in (WILL, WONT) and opt == TM and self._tm_stale:
+                # replies arrive in order: this one is of an expired request
+                self._tm_stale -= 1
+                self.log.debug('{} TIMING-MARK of expired request'.format(
+                    _name_command(cmd)))
+            elif cmd == DO:
                 if self.handle_do(opt):
                     self.local_option[opt] = True
                     if self.pending_option.enabled(WILL + opt):
@@ -288,7 +430,12 @@ class TelnetStreamReader:
             self.iac_received = False
             self.cmd_received = (opt, byte)
 
-        elif self.pending_option.enabled(DO + TM):
+        elif self._synching:
+            # "Synch" received; discard all in-band input, including SLC
+            # characters, until IAC DM is received.
+            self.log.debug('discarded by synch: {!r}'.format(byte))
+
+        elif self._tm_discard and self.pending_option.enabled(DO + TM):
             # IAC DO TM was previously sent; discard all input until
             # IAC WILL TM or IAC WONT TM is received by remote end.
             self.log.debug('discarded by timing-mark: {!r}'.format(byte))
@@ -303,14 +450,12 @@ class TelnetStreamReader:
                         byte, name_slc_command(slc_name),
                         callback.__name__ if callback is not None else None))
                 if slc_def.flushin:
-                    # SLC_FLUSHIN not supported, requires SYNCH (urgent TCP).
-                    pass
-                if slc_def.flushout:
-                    # XXX
-                    # We must call transport.pause_writing, create a new send
-                    # buffer without incompleted IAC bytes, call
-                    # discard_output, write new buffer, then resume_writing
+                    # SLC_FLUSHIN: input is flushed by the "Synch" that the
+                    # client sends to follow it, see ``urgent_received()``.
                     pass
+                if slc_def.flushout and slc_name != SLC_AO:
+                    # SLC_AO discards output by its callback, ``handle_ao``
+                    self.discard_output()
                 # allow caller to know which SLC function caused linemode
                 # to process, even though CR was not yet discovered.
                 self.slc_received = slc_name
@@ -321,7 +466,29 @@ class TelnetStreamReader:
             return
         if not self._xmit and self.xon_any and not self.is_oob:
             # any key after XOFF enables XON
-            self._slc_callback[SLC_XON]()
+            self._slc_func(SLC_XON)(SLC_XON)
+
+    def inband_run(self, data, start=0):
+        """ .. method:: inband_run(data : bytes, start : int) -> int
+
+            Returns end of run of ``data``, from ``start``, that would be
+            received by ``feed_byte()`` as in-band printable 7-bit ascii,
+            without side effect, and consume it: not within an IAC command,
+            "Synch", or TIMING-MARK, not stopped by XOFF, and without any SLC
+            character. Returns ``start`` if there is none.
+        """
+        if (self.iac_received or self.cmd_received in (DO, DONT, WILL, WONT, SB)
+                or self._synching or not self._xmit or (
+                    self._tm_discard and self.pending_option.enabled(DO + TM))):
+            return start
+        match = _inband_pattern(bytes(self._slctab.values)).match(data, start)
+        if match is None:
+            return start
+        self.byte_count += match.end() - start
+        self._dm_recv = False
+        self.slc_received = False
+        self.cmd_received = False
+        return match.end()
 
     def write(self, data, oob=False):
         """ .. method:: feed_byte(byte : bytes)
@@ -344,16 +511,206 @@ class TelnetStreamReader:
                 assert byte < 128, (
                         'character value {} at pos {} not valid, send '
                         'IAC WILL BINARY first: {}'.format(byte, pos, data))
+        if (self._out_queue is None and self.scheduler is not None
+                and not self.scheduler.admit(self, len(data))):
+            # quantum of this iteration exceeded, wait for our turn.
+            self._out_queue = collections.deque()
+        if self._out_queue is not None:
+            self._queue_output(data)
+            if self.scheduler is not None and not self._holding:
+                self.scheduler.activate(self)
+            return
         self.transport.write(escape_iac(data))
 
+    def _queue_output(self, data):
+        """ Queue in-band output ``data`` while stopped by XOFF, up to
+            ``xoff_maxsize`` bytes, or while paused by the transport.
+        """
+        queue = self._out_queue
+        if queue and isinstance(queue[-1], bytearray):
+            queue[-1].extend(data)
+        else:
+            queue.append(bytearray(data))
+        self._out_size += len(data)
+        if not self._xmit and self._out_size > self.xoff_maxsize:
+            self._xoff_overflow(self._out_size - self.xoff_maxsize)
+        self.xoff_peak = max(self.xoff_peak, self._out_size)
+
+    def _xoff_overflow(self, overflow):
+        """ Discard ``overflow`` bytes of queued output, or close the
+            connection, by policy ``xoff_overflow``.
+        """
+        if self.xoff_overflow == 'close':
+            self.log.info('XOFF buffer exceeded {} bytes, closing.'
+                          .format(self.xoff_maxsize))
+            self._out_queue, self._out_size = None, 0
+            self.transport.close()
+            return
+        if self.xoff_overflow == 'truncate':
+            # discard oldest output, up to the next whole character
+            for buf in [buf for buf in self._out_queue
+                        if isinstance(buf, bytearray)]:
+                pos = min(overflow, len(buf))
+                while (self.output_utf8 and pos < len(buf)
+                       and 0x80 <= buf[pos] < 0xc0):
+                    pos += 1
+                del buf[:pos]
+                self._out_size -= pos
+                self.xoff_discarded += pos
+                overflow -= pos
+                if overflow <= 0:
+                    break
+        else:
+            # discard newest output, after the last whole character
+            buf = self._out_queue[-1]
+            pos = max(0, len(buf) - overflow)
+            while self.output_utf8 and pos and 0x80 <= buf[pos] < 0xc0:
+                pos -= 1
+            self._out_size -= len(buf) - pos
+            self.xoff_discarded += len(buf) - pos
+            del buf[pos:]
+
+    def _flush_output(self, limit=None):
+        """ Write queued output to transport, until stopped by XOFF,
+            paused again by the transport, or ``limit`` bytes of in-band
+            data are written. Returns number of bytes written.
+
+            With a ``scheduler``, output is written only by its turn.
+        """
+        queue = self._out_queue
+        if limit is None and self.scheduler is not None and queue:
+            if not self._holding:
+                self.scheduler.activate(self)
+            return 0
+        written = 0
+        while queue and not self._holding and (
+                limit is None or written < limit):
+            buf = queue[0]
+            if isinstance(buf, bytearray):
+                size = (self.FLUSH_SIZE if limit is None
+                        else min(self.FLUSH_SIZE, limit - written))
+                data = buf[:size]
+                del buf[:size]
+                if not buf:
+                    queue.popleft()
+                self._out_size -= len(data)
+                written += len(data)
+                self.transport.write(escape_iac(data))
+            else:
+                self.transport.write(queue.popleft())
+        if not queue and not self._holding:
+            self._out_queue = None
+        if (written and self.drain_callback is not None
+                and self._out_size <= self.FLUSH_SIZE):
+            self.drain_callback()
+        return written
+
+    def drain_output(self):
+        """ Write all queued output to transport, regardless of XOFF,
+            the transport pausing, or turn of the ``scheduler``; called
+            before the transport is closed.
+        """
+        queue = self._out_queue
+        self._out_queue = collections.deque() if self._holding else None
+        self._out_size = 0
+        for buf in queue or ():
+            self.transport.write(escape_iac(buf) if isinstance(buf, bytearray)
+                                 else buf)
+
+    def pause_output(self):
+        """ Queue further output, called when writing is paused by
+            the transport, so that it may be discarded by AO.
+        """
+        self._out_paused = True
+        if self._out_queue is None:
+            self._out_queue = collections.deque()
+
+    def resume_output(self):
+        """ Write queued output, called when writing is resumed by the
+            transport.
+        """
+        self._out_paused = False
+        self._flush_output()
+
+    def discard_output(self):
+        """ Discard all queued in-band output, keeping any IAC commands,
+            then send IAC DM (Data Mark), signalling the client that output
+            was aborted.
+
+            Output already written to the transport cannot be recalled; but
+            while the client is slow to receive, output is queued by
+            ``pause_output()``.
+        """
+        if self._out_queue:
+            commands = [buf for buf in self._out_queue
+                        if not isinstance(buf, bytearray)]
+            self._out_queue.clear()
+            self._out_queue.extend(commands)
+        self.log.debug('discard_output: {} bytes'.format(self._out_size))
+        self.ao_discarded += self._out_size
+        self._out_size = 0
+        self.send_synch()
+
+    def send_synch(self):
+        """ Send "Synch", IAC DM with DM marked urgent (TCP MSG_OOB), so
+            that the client may discard all output preceding it without
+            waiting to receive it.
+
+            Urgent data can only be sent in order when no other output is
+            waiting to be written by the transport, otherwise IAC DM is sent
+            in-band, as it is for transports without a socket.
+        """
+        sock = self.transport.get_extra_info('socket')
+        if (sock is None or self._out_queue
+                or not hasattr(self.transport, 'get_write_buffer_size')
+                or self.transport.get_write_buffer_size()):
+            self.send_iac(IAC + DM)
+            return
+        try:
+            if self._urgent_sock is None:
+                # the transport's socket may not be used directly for
+                # sending; a duplicate is kept for the session.
+                self._urgent_sock = sock.dup()
+            sent = self._urgent_sock.send(IAC + DM, socket.MSG_OOB)
+        except OSError as err:
+            self.log.debug('send synch: {}'.format(err))
+            sent = 0
+        if sent < 2:
+            self.transport.write((IAC + DM)[sent:])
+        self.log.debug('send IAC DM (urgent)')
+
+    def close(self):
+        """ Release socket duplicated by ``send_synch()``, if any, called
+            when the connection is lost.
+        """
+        if self._urgent_sock is not None:
+            self._urgent_sock.close()
+            self._urgent_sock = None
+
     def send_iac(self, data):
         """ .. method: send_iac(self, data : bytes)
 
             No transformations of bytes are performed, Only complete
             IAC commands are legal.
+
+            Commands of option negotiation, see ``_is_control()``, are
+            written ahead of any queued output, so that replies awaited by
+            the remote end are not delayed by bulk data. Commands of BINARY
+            and CHARSET, which change how the output following them is
+            received, keep their position in output. Queued in-band data
+            is only ever written whole segments at a time, escaped, so that
+            a command is never inserted within an escaped run.
         """
         assert isinstance(data, (bytes, bytearray)), data
         assert data and data.startswith(IAC), data
+        if _is_control(data):
+            if self._out_queue:
+                self.control_ahead += 1
+        elif self._out_paused or self._out_queue:
+            # queued in order with in-band data, also while stopped by
+            # XOFF, so that output preceding it is received first.
+            self._out_queue.append(bytes(data))
+            return
         self.transport.write(data)
 
     def iac(self, cmd, opt=None):
@@ -406,6 +763,87 @@ class TelnetStreamReader:
             self.send_iac(IAC + cmd + opt)
         self.log.debug('send IAC {}'.format(_name_command(cmd),
             ' {}'.format(_name_command(opt)) if cmd in short_iacs else ''))
+        return True
+
+    def request_timing_mark(self, discard=True):
+        """ .. method: request_timing_mark(discard=True) -> bool
+
+            Send IAC DO TM, its reply, WILL or WONT TM, is received by
+            the extended callback for TM. When ``discard`` is False, input
+            is not discarded while awaiting reply, as when used to measure
+            round-trip time. Returns False if a timing-mark is already
+            pending.
+        """
+        if not self.iac(DO, TM):
+            return False
+        self._tm_discard = discard
+        return True
+
+    def expire_timing_mark(self):
+        """ .. method: expire_timing_mark() -> bool
+
+            Expire a pending IAC DO TM left unanswered, so that another may
+            be sent by ``request_timing_mark()``. Its reply, should it yet
+            arrive, is ignored. Returns False if none is pending.
+        """
+        if not self.pending_option.enabled(DO + TM):
+            return False
+        self.pending_option[DO + TM] = False
+        self._tm_discard = True
+        self._tm_stale += 1
+        return True
+
+    def iac_plan(self, plan):
+        """ .. method: iac_plan(self, plan : tuple) -> bool
+
+            Send each IAC 3-byte command option of ``plan``, a tuple of
+            (cmd, opt) pairs, where cmd is DO, DONT, WILL, or WONT, in a
+            single write, pre-encoded once for each distinct plan.
+
+            As with ``iac()``, requests for options already enabled or
+            pending are skipped. Returns True if any commands were sent.
+        """
+        encoded, pending, descr = _compile_plan(plan)
+        unsent = [(cmd, opt) for cmd, opt in plan if self._iac_skip(cmd, opt)]
+        if unsent:
+            plan = tuple((cmd, opt) for cmd, opt in plan
+                         if (cmd, opt) not in unsent)
+            if not plan:
+                return False
+            encoded, pending, descr = _compile_plan(plan)
+        for key in pending:
+            self.pending_option[key] = True
+        for cmd, opt in plan:
+            if cmd == DONT:
+                self.remote_option[opt] = False
+            elif cmd == WONT:
+                self.local_option[opt] = False
+        self.send_iac(encoded)
+        self.log.debug('send {}'.format(descr))
+        return True
+
+    def _iac_skip(self, cmd, opt):
+        """ Returns True if IAC ``cmd`` ``opt`` should not be sent by
+            ``iac_plan()``: the option is already enabled or requested.
+        """
+        if opt == LINEMODE:
+            if cmd == DO and not self.is_server:
+                raise ValueError('DO LINEMODE may only be sent by server.')
+            if cmd == WILL and self.is_server:
+                raise ValueError('WILL LINEMODE may only be sent by client.')
+        if cmd == DO and self.remote_option.enabled(opt):
+            self.log.debug('skip {} {}; remote_option = True'.format(
+                _name_command(cmd), _name_command(opt)))
+            return True
+        if cmd in (DO, WILL) and self.pending_option.enabled(cmd + opt):
+            self.log.debug('skip {} {}; pending_option = True'.format(
+                _name_command(cmd), _name_command(opt)))
+            return True
+        if cmd == WILL and opt != TM and self.local_option.enabled(opt):
+            self.log.debug('skip {} {}; local_option = True'.format(
+                _name_command(cmd), _name_command(opt)))
+            return True
+        return False
 
 # Public methods for notifying about, soliciting, or advertising state options.
 #
@@ -441,8 +879,7 @@ class TelnetStreamReader:
             pass
         if not self.pending_option.enabled(SB + STATUS):
             self.pending_option[SB + STATUS] = True
-            self.send_iac(
-                b''.join([IAC, SB, STATUS, SEND, IAC, SE]))
+            self.send_iac(_SB_STATUS_SEND)
             # set pending for SB STATUS
             self.pending_option[SB + STATUS] = True
             return True
@@ -459,34 +896,35 @@ class TelnetStreamReader:
             pass
         if not self.pending_option.enabled(SB + TSPEED):
             self.pending_option[SB + TSPEED] = True
-            response = [IAC, SB, TSPEED, SEND, IAC, SE]
             self.log.debug('send: IAC SB TSPEED SEND IAC SE')
-            self.send_iac(b''.join(response))
+            self.send_iac(_SB_TSPEED_SEND)
             return True
 
-    def request_charset(self, codepages=None, sep=' '):
+    def request_charset(self, codepages=None, sep=';'):
         """ .. method:: request_charset(codepages : list, sep : string) -> bool
 
             Request sub-negotiation CHARSET, rfc 2066.
-            Returns True if request is valid for telnet state, and was sent.
-        """ # TODO: find client that works!
+
+            ``codepages`` is list of charset names offered, in order of
+            preference. Default value is when unset is instance attribute
+            ``_default_charset_request``. Returns True if request is valid
+            for telnet state, and was sent.
+        """
         #  At least some modern MUD clients and popular asian telnet BBS
-        #  systems use CHARSET, and reply 'UTF-8' (or 'GBK',).  """
+        #  systems use CHARSET, and reply 'UTF-8' (or 'GBK',).
+        codepages = tuple(self._default_charset_request
+                          if codepages is None else codepages)
         if not self.remote_option.enabled(CHARSET):
-            pass
-        (REQUEST, ACCEPTED, REJECTED, TTABLE_IS, TTABLE_REJECTED,
-            TTABLE_ACK, TTABLE_NAK) = (bytes([const]) for const in range(1, 8))
+            self.log.debug('cannot send SB CHARSET REQUEST '
+                           'without receipt of WILL CHARSET')
+            return False
         if not self.pending_option.enabled(SB + CHARSET):
             self.pending_option[SB + CHARSET] = True
-            response = [IAC, SB, CHARSET, REQUEST]
-            response.extend(bytes(sep.join(codepages), 'ascii'))
-            response.extend([IAC, SE])
             self.log.debug('send: IAC SB CHARSET REQUEST {} IAC SE'.format(
-                sep.join(codepages)))
-            self.send_iac(b''.join(response))
+                sep + sep.join(codepages)))
+            self.send_iac(_encode_charset_request(codepages, sep))
             return True
 
-
     def request_env(self, env=None):
         """ .. method:: request_env(env : list) -> bool
 
@@ -514,15 +952,9 @@ class TelnetStreamReader:
                 'request pending.'.format(_name_command(kind)))
             return False
         self.pending_option[SB + kind + SEND + IS] = True
-        response = collections.deque()
-        response.extend([IAC, SB, kind, SEND, IS])
-        for idx, env in enumerate(request_ENV):
-            response.extend([bytes(char, 'ascii') for char in env])
-            if idx < len(request_ENV) - 1:
-                response.append(theNULL)
-        response.extend([b'\x03', IAC, SE])
-        self.log.debug('send: {!r}'.format(b''.join(response)))
-        self.send_iac(b''.join(response))
+        response = _encode_env_request(tuple(request_ENV))
+        self.log.debug('send: {!r}'.format(response))
+        self.send_iac(response)
         return True
 
     def request_xdisploc(self):
@@ -535,9 +967,8 @@ class TelnetStreamReader:
             pass
         if not self.pending_option.enabled(SB + XDISPLOC):
             self.pending_option[SB + XDISPLOC] = True
-            response = [IAC, SB, XDISPLOC, SEND, IAC, SE]
             self.log.debug('send: IAC SB XDISPLOC SEND IAC SE')
-            self.send_iac(b''.join(response))
+            self.send_iac(_SB_XDISPLOC_SEND)
             return True
 
     def request_ttype(self):
@@ -550,9 +981,8 @@ class TelnetStreamReader:
             pass
         if not self.pending_option.enabled(SB + TTYPE):
             self.pending_option[SB + TTYPE] = True
-            response = [IAC, SB, TTYPE, SEND, IAC, SE]
             self.log.debug('send: IAC SB TTYPE SEND IAC SE')
-            self.send_iac(b''.join(response))
+            self.send_iac(_SB_TTYPE_SEND)
             return True
 
     def send_eor(self):
@@ -626,6 +1056,8 @@ class TelnetStreamReader:
         assert callable(func), ('Argument func must be callable')
         assert cmd in (BRK, IP, AO, AYT, EC, EL, EOR_CMD, EOF, SUSP,
                        ABORT, NOP, DM, GA), cmd
+        if self._iac_callback is None:
+            self._iac_callback = {}
         self._iac_callback[cmd] = func
 
     def handle_nop(self, cmd):
@@ -639,20 +1071,26 @@ class TelnetStreamReader:
         self.log.debug('IAC GA: Go-Ahead')
 
     def handle_dm(self, cmd):
-        """ XXX Handle IAC Data-Mark (DM)
+        """ Handle IAC Data-Mark (DM)
 
-            Callback sets ``self._dm_recv``.  when IAC + DM is received.
-            The TCP transport is not tested for OOB/TCP Urgent, so an old
-            teletype half-duplex terminal may inadvertantly send unintended
-            control sequences up until now,
-
-            Oh well.  """
-        self.log.debug('IAC DM: received')
+            Callback sets ``self._dm_recv``.  when IAC + DM is received,
+            ending "Synch": in-band input discarded since urgent data was
+            received by ``urgent_received()`` is again accepted.
+        """
+        self.log.debug('IAC DM: received{}'.format(
+            ', end of synch' if self._synching else ''))
         #: ``True`` if the last byte sent to ``feed_byte()`` was the end
-        #  of an *IAC DM* has been received. MSG_OOB not implemented, so
-        #  this mechanism _should not be implmeneted_.
+        #  of an *IAC DM* has been received.
         self._dm_recv = True
-        #self.iac(DM)
+        self._synching = False
+
+    def urgent_received(self):
+        """ Begin "Synch", called when TCP urgent data is pending: all
+            in-band input is discarded, while IAC commands are still
+            processed, until IAC DM is received.
+        """
+        self.log.debug('urgent data received, synch until IAC DM')
+        self._synching = True
 
 # Public mixed-mode SLC and IAC callbacks
 #
@@ -720,24 +1158,26 @@ class TelnetStreamReader:
     def handle_ao(self, byte):
         """ XXX Handle IAC Abort Output (AO) or SLC_AO.
 
-            Discards any remaining output on the transport buffer.
+            Discards any remaining output queued for the transport.
         """
         #   "If the AO were received [...] a reasonable implementation would
         #   be to suppress the remainder of the text string, *but transmit the
         #   prompt character and the preceding <CR><LF>*."
-        # XXX TODO: Must netsend()
         self.log.debug('IAC AO: Abort Output')
-        pass
-        #self.stream.discard_output()
+        self.discard_output()
 
     def handle_xon(self, byte):
         """ XXX handle Transmit-On (IAC, XON) or SLC_XON.
 
-            Pauses writing to the transport.
+            Resumes writing to the transport, sending any output buffered
+            since XOFF was received.
         """
         self.log.debug('IAC XON: Transmit On')
         self._xmit = True
-        self.transport.resume_writing()
+        if hasattr(self.transport, 'resume_writing'):
+            # only the bundled tulip transport may pause writing
+            self.transport.resume_writing()
+        self._flush_output()
 
     def handle_ec(self, byte):
         """ XXX Handle IAC + SLC or SLC_EC (Erase Character).
@@ -766,7 +1206,10 @@ class TelnetStreamReader:
         assert callable(func), ('Argument func must be callable')
         assert (type(slc) == bytes and
                 0 < ord(slc) < NSLC + 1), ('Uknown SLC byte: %r' % (slc,))
+        if self._slc_callback is None:
+            self._slc_callback = {}
         self._slc_callback[slc] = func
+        self._update_forwardmask(self._slctab.values[ord(slc)])
 
     def handle_ew(self, slc):
         """ XXX Handle SLC_EW (Erase Word).
@@ -789,28 +1232,41 @@ class TelnetStreamReader:
 
     def handle_xoff(self, slc):
         """ Called when SLC_XOFF is received.
+
+            Unless disabled by LFLOW_OFF, output is buffered, up to
+            ``xoff_maxsize`` bytes, until XON is received.
         """
+        if not self.lflow:
+            self.log.debug('IAC XOFF: ignored, LFLOW_OFF')
+            return
         self.log.debug('IAC XOFF: Transmit Off')
         self._xmit = False
-        self.transport.pause_writing()
+        if self._out_queue is None:
+            self._out_queue = collections.deque()
+        if hasattr(self.transport, 'pause_writing'):
+            # only the bundled tulip transport may pause writing
+            self.transport.pause_writing()
 
 # public Telnet extension callbacks
 #
     def set_ext_callback(self, cmd, func):
         """ Register ``func`` as callback for subnegotiation result of ``cmd``.
 
-        cmd must be one of: TTYPE, TSPEED, XDISPLOC, NEW_ENVIRON, or NAWS.
+        cmd must be one of: TTYPE, TSPEED, XDISPLOC, NEW_ENVIRON, NAWS, or TM.
 
         These callbacks may receive a number of arguments.
 
         Callbacks for ``TTYPE`` and ``XDISPLOC`` receive a single argument
         as a bytestring. ``NEW_ENVIRON`` receives a single argument as
         dictionary. ``NAWS`` receives two integer arguments (width, height),
-        and ``TSPEED`` receives two integer arguments (rx, tx).
+        and ``TSPEED`` receives two integer arguments (rx, tx). ``TM``
+        receives the reply to IAC DO TM, WILL or WONT.
         """
         assert cmd in (TTYPE, TSPEED, XDISPLOC,
-                NEW_ENVIRON, NAWS, LOGOUT, CHARSET, SNDLOC), cmd
+                NEW_ENVIRON, NAWS, LOGOUT, CHARSET, SNDLOC, TM), cmd
         assert callable(func), ('Argument func must be callable')
+        if self._ext_callback is None:
+            self._ext_callback = {}
         self._ext_callback[cmd] = func
 
     def handle_xdisploc(self, xdisploc):
@@ -850,6 +1306,16 @@ class TelnetStreamReader:
         """
         self.log.debug('env=%r', env)
 
+    def handle_timing_mark(self, cmd):
+        """ XXX Receive reply ``cmd``, WILL or WONT, to IAC DO TM, rfc860.
+        """
+        self.log.debug('Timing-mark reply: {}'.format(_name_command(cmd)))
+
+    def handle_charset(self, charset):
+        """ XXX Receive charset ``charset`` accepted, rfc2066.
+        """
+        self.log.debug('Character set is {}'.format(charset))
+
     def handle_tspeed(self, rx, tx):
         """ XXX Receive terminal speed from TSPEED as int, rfc1079
         """
@@ -908,7 +1374,7 @@ class TelnetStreamReader:
         elif opt == TM:
             self.iac(WILL, TM)
         elif opt == LOGOUT:
-            self._ext_callback[LOGOUT](DO)
+            self._ext_func(LOGOUT)(DO)
         elif opt in (ECHO, LINEMODE, BINARY, SGA, LFLOW, EXOPL, EOR):
             if not self.local_option.enabled(opt):
                 self.iac(WILL, opt)
@@ -934,7 +1400,7 @@ class TelnetStreamReader:
         self.log.debug('handle_dont(%s)' % (_name_command(opt)))
         if opt == LOGOUT:
             assert self.is_server, ('cannot recv DONT LOGOUT on server end')
-            self._ext_callback[LOGOUT](DONT)
+            self._ext_func(LOGOUT)(DONT)
             return
         # many implementations (wrongly!) sent a WONT in reply to DONT. It
         # sounds reasonable, but it can and will cause telnet loops. (ruby?)
@@ -981,10 +1447,12 @@ class TelnetStreamReader:
                 raise ValueError('cannot recv WILL TM, must first send DO TM.')
             self.log.debug('WILL TIMING-MARK')
             self.pending_option[DO + TM] = False
+            self._tm_discard = True
+            self._ext_func(TM)(WILL)
         elif opt == LOGOUT:
             if opt == LOGOUT and not self.is_server:
                 raise ValueError('cannot recv WILL LOGOUT on server end')
-            self._ext_callback[LOGOUT](WILL)
+            self._ext_func(LOGOUT)(WILL)
         elif opt == STATUS:
             self.remote_option[opt] = True
             self.request_status()
@@ -1033,12 +1501,14 @@ class TelnetStreamReader:
         elif opt == TM:
             self.log.debug('WONT TIMING-MARK')
             self.pending_option[DO + TM] = False
+            self._tm_discard = True
+            self._ext_func(TM)(WONT)
         elif opt == LOGOUT:
             assert not (self.is_server), (
                 'cannot recv WONT LOGOUT on server end')
             if not self.pending_option(DO + LOGOUT):
                 self.log.warn('Server sent WONT LOGOUT unsolicited')
-            self._ext_callback[LOGOUT](WONT)
+            self._ext_func(LOGOUT)(WONT)
         else:
             self.remote_option[opt] = False
 
@@ -1048,13 +1518,13 @@ class TelnetStreamReader:
         """ Callback for end of sub-negotiation buffer.
 
             SB options handled here are TTYPE, XDISPLOC, NEW_ENVIRON,
-            NAWS, and STATUS, and are delegated to their ``handle_``
+            NAWS, CHARSET, and STATUS, and are delegated to their ``handle_``
             equivalent methods. Implementors of additional SB options
             should extend this method.
         """
         #   Changes to the default responses should replace the
         #   default callbacks ``handle_ttype``, ``handle_xdisploc``,
-        #   ``handle_env``, and ``handle_naws``, by using
+        #   ``handle_env``, ``handle_naws``, and ``handle_charset``, by using
         #   ``set_ext_callback(opt_byte, func)``.
         #
         assert buf, ('SE: buffer empty')
@@ -1062,9 +1532,12 @@ class TelnetStreamReader:
         assert len(buf) > 1, ('SE: buffer too short: %r' % (buf,))
         cmd = buf[0]
         if self.is_server:
-            assert cmd in (LINEMODE, LFLOW, NAWS, SNDLOC,
-                NEW_ENVIRON, TTYPE, TSPEED, XDISPLOC, STATUS), _name_command(cmd)
-        if self.pending_option.enabled(SB + cmd):
+            assert cmd in (LINEMODE, LFLOW, NAWS, SNDLOC, NEW_ENVIRON,
+                TTYPE, TSPEED, XDISPLOC, STATUS, CHARSET), _name_command(cmd)
+        if (cmd, buf[1]) == (CHARSET, CHARSET_REQUEST):
+            # a request of the remote end, not a reply to our own.
+            pass
+        elif self.pending_option.enabled(SB + cmd):
             self.pending_option[SB + cmd] = False
         else:
             self.log.debug('[SB + %s] unsolicited', _name_command(cmd))
@@ -1077,6 +1550,8 @@ class TelnetStreamReader:
             self._handle_sb_sndloc(buf)
         elif cmd == NEW_ENVIRON:
             self._handle_sb_env(buf)
+        elif cmd == CHARSET:
+            self._handle_sb_charset(buf)
         elif (cmd, buf[1]) == (TTYPE, IS):
             self._handle_sb_ttype(buf)
         elif (cmd, buf[1]) == (TSPEED, IS):
@@ -1123,21 +1598,68 @@ class TelnetStreamReader:
                 break
             tx += value.decode('ascii')
         self.log.debug('sb_tspeed: %s, %s', rx, tx)
-        self._ext_callback[TSPEED](int(rx), int(tx))
+        self._ext_func(TSPEED)(int(rx), int(tx))
 
     def _handle_sb_xdisploc(self, buf):
         assert buf.popleft() == XDISPLOC
         assert buf.popleft() == IS
         xdisploc_str = b''.join(buf).decode('ascii')
         self.log.debug('sb_xdisploc: %s', xdisploc_str)
-        self._ext_callback[XDISPLOC](xdisploc_str)
+        self._ext_func(XDISPLOC)(xdisploc_str)
+
+    def _handle_sb_charset(self, buf):
+        assert buf.popleft() == CHARSET
+        opt = buf.popleft()
+        if opt == CHARSET_ACCEPTED:
+            charset = b''.join(buf).decode('ascii', 'replace')
+            self.log.debug('sb_charset: ACCEPTED {}'.format(charset))
+            self._ext_func(CHARSET)(charset)
+        elif opt == CHARSET_REJECTED:
+            self.log.debug('sb_charset: REJECTED')
+        elif opt == CHARSET_REQUEST:
+            self._handle_sb_charset_request(b''.join(buf))
+        elif opt == CHARSET_TTABLE_IS:
+            # translation tables are not supported.
+            self.log.debug('sb_charset: TTABLE-IS, send TTABLE-REJECTED')
+            self.send_iac(b''.join([IAC, SB, CHARSET,
+                                    CHARSET_TTABLE_REJECTED, IAC, SE]))
+        else:
+            self.log.debug('sb_charset: unhandled {!r}'.format(opt))
+
+    def _handle_sb_charset_request(self, request):
+        """ Reply IAC SB CHARSET ACCEPTED with the first charset of
+            ``request``, '[TTABLE <version>] <sep> <charset> ...', known
+            by ``CODECS``, or REJECTED if none are.
+        """
+        if request.startswith(b'TTABLE '):
+            request = request[len(b'TTABLE ') + 1:]
+        names = (request[1:].decode('ascii', 'replace').split(
+                 request[:1].decode('ascii', 'replace'))
+                 if len(request) > 1 else [])
+        charset = None
+        if self.is_server and self.pending_option.enabled(SB + CHARSET):
+            # rfc2066: when both ends send REQUEST, the server's wins.
+            self.log.debug('sb_charset: REQUEST {} collides with our own'
+                           .format(names))
+        else:
+            charset = CODECS.select(name for name in names if name)
+        if charset is None:
+            self.log.debug('send: IAC SB CHARSET REJECTED IAC SE')
+            self.send_iac(b''.join([IAC, SB, CHARSET, CHARSET_REJECTED,
+                                    IAC, SE]))
+            return
+        self.log.debug('send: IAC SB CHARSET ACCEPTED {} IAC SE'.format(
+            charset))
+        self.send_iac(b''.join([IAC, SB, CHARSET, CHARSET_ACCEPTED,
+                                bytes(charset, 'ascii'), IAC, SE]))
+        self._ext_func(CHARSET)(charset)
 
     def _handle_sb_ttype(self, buf):
         assert buf.popleft() == TTYPE
         assert buf.popleft() == IS
         ttype_str = b''.join(buf).decode('ascii')
         self.log.debug('sb_ttype: %s', ttype_str)
-        self._ext_callback[TTYPE](ttype_str)
+        self._ext_func(TTYPE)(ttype_str)
 
     def _handle_sb_env(self, buf):
         assert len(buf) > 2, ('SE: buffer too short: %r' % (buf,))
@@ -1171,7 +1693,7 @@ class TelnetStreamReader:
                     key, value = pair
                     env[key] = value
             self.log.debug('sb_env %s: %r', _name_command(opt), env)
-            self._ext_callback[kind](env)
+            self._ext_func(kind)(env)
             return
 
     def _handle_sb_env_send(self, buf):
@@ -1179,14 +1701,14 @@ class TelnetStreamReader:
 
     def _handle_sb_sndloc(self, buf):
         location_str = b''.join(buf).decode('ascii')
-        self._ext_callback[SNDLOC](location_str)
+        self._ext_func(SNDLOC)(location_str)
 
     def _handle_sb_naws(self, buf):
         assert buf.popleft() == NAWS
         columns = str((256 * ord(buf[0])) + ord(buf[1]))
         rows = str((256 * ord(buf[2])) + ord(buf[3]))
         self.log.debug('sb_naws: %s, %s', int(columns), int(rows))
-        self._ext_callback[NAWS](int(columns), int(rows))
+        self._ext_func(NAWS)(int(columns), int(rows))
 
     def _handle_sb_lflow(self, buf):
         """ Handle receipt of (IAC, SB, LFLOW).
@@ -1195,6 +1717,17 @@ class TelnetStreamReader:
         assert self.local_option.enabled(LFLOW), (
             'received IAC SB LFLOW wihout IAC DO LFLOW')
         self.log.debug('sb_lflow: %r', buf)
+        mode = buf.popleft()
+        if mode == LFLOW_OFF:
+            self.lflow = False
+            if not self._xmit:
+                self._slc_func(SLC_XON)(SLC_XON)
+        elif mode == LFLOW_ON:
+            self.lflow = True
+        elif mode in (LFLOW_RESTART_ANY, LFLOW_RESTART_XON):
+            self.xon_any = (mode == LFLOW_RESTART_ANY)
+        else:
+            self.log.debug('sb_lflow: unknown mode {!r}'.format(mode))
 
 
     def _handle_sb_linemode(self, buf):
@@ -1226,10 +1759,10 @@ class TelnetStreamReader:
         assert 0 == len(buf) % 3, ('SLC buffer must be byte triplets')
         self._slc_start()
         while len(buf):
-            func = buf.popleft()
-            flag = buf.popleft()
-            value = buf.popleft()
-            self._slc_process(func, SLC_definition(flag, value))
+            func = ord(buf.popleft())
+            flags = ord(buf.popleft())
+            value = ord(buf.popleft())
+            self._slc_process(func, flags, value)
         self._slc_end()
         self.request_forwardmask()
 
@@ -1301,14 +1834,25 @@ class TelnetStreamReader:
             is unlisted (as is the case for SLC_MCL+), then set as
             SLC_NOSUPPORT _POSIX_VDISABLE (0xff).
 
-            ``_slctab`` is a dictionary of SLC functions, such as SLC_IP,
-            to a tuple of the handling character and support level.
+            ``_slctab`` is an ``SLC_tab`` of integer flags and values of
+            each SLC function, such as SLC_IP. It is shared by all streams
+            of the same tabset until first modified, see ``_slc_writable()``.
         """
-        self._slctab = {}
         self._default_tabset = tabset
-        for slc in range(NSLC + 1):
-            self._slctab[bytes([slc])] = tabset.get(bytes([slc]),
-                    SLC_definition(SLC_NOSUPPORT, _POSIX_VDISABLE))
+        self._slctab = _shared_slctab(tabset)
+        self._slctab_shared = True
+        #: bitmask of all 256 characters forwarded, generated on first use
+        #  by ``_generate_forwardmask()``, then updated as SLC tab changes.
+        self._forwardmask = None
+
+    def _slc_writable(self):
+        """ Returns ``_slctab`` for modification, replacing the shared
+            default SLC tab with a private copy on first use.
+        """
+        if self._slctab_shared:
+            self._slctab = self._slctab.copy()
+            self._slctab_shared = False
+        return self._slctab
 
     def _slc_snoop(self, byte):
         """ Scan ``self._slctab`` for matching byte values.
@@ -1317,103 +1861,113 @@ class TelnetStreamReader:
             is returned. Otherwise (None, None, None) is returned.
         """
         # scan byte for SLC function mappings, if any, return function
-        for slc_func, slc_def in self._slctab.items():
-            if byte == slc_def.val and slc_def.val != theNULL:
-                callback = self._slc_callback.get(slc_func, None)
-                return (callback, slc_func, slc_def)
-        return (None, None, None)
-
+        func = self._slctab.find(ord(byte))
+        if func == -1:
+            return (None, None, None)
+        slc_func = bytes([func])
+        return (self._slc_func(slc_func), slc_func, self._slctab[func])
 
     def _slc_end(self):
-        """ Send any SLC pending SLC changes sotred in _slc_buffer """
-        if 0 == len(self._slc_buffer):
+        """ Send IAC SB LINEMODE SLC with any SLC changes stored in
+            _slc_buffer, as a single command.
+        """
+        if not self._slc_buffer:
             self.log.debug('slc_end: IAC SE')
         else:
-            self.write(b''.join(self._slc_buffer), oob=True)
-            self.log.debug('slc_end: (%r) IAC SE', b''.join(self._slc_buffer))
-        self.send_iac(IAC + SE)
-        self._slc_buffer.clear()
+            self.log.debug('slc_end: (%r) IAC SE', bytes(self._slc_buffer))
+        self.send_iac(b''.join([IAC, SB, LINEMODE, LMODE_SLC,
+                                escape_iac(bytes(self._slc_buffer or b'')),
+                                IAC, SE]))
+        self._slc_buffer = None
 
     def _slc_start(self):
-        """ Send IAC SB LINEMODE SLC header """
-        self.send_iac(IAC + SB + LINEMODE + LMODE_SLC)
+        """ Begin IAC SB LINEMODE SLC, sent by ``_slc_end()`` """
         self.log.debug('slc_start: IAC + SB + LINEMODE + SLC')
 
     def _slc_send(self):
         """ Send all special characters that are supported """
         send_count = 0
         for func in range(NSLC + 1):
-            if self._slctab[bytes([func])].nosupport:
+            if self._slctab.nosupport(func):
                 continue
-            if func is 0 and not self.is_server:
+            if func == 0 and not self.is_server:
                 # only the server may send an octet with the first
                 # byte (func) set as 0 (SLC_NOSUPPORT).
                 continue
-            self._slc_add(bytes([func]))
+            self._slc_add(func)
             send_count += 1
         self.log.debug('slc_send: %d', send_count)
 
-    def _slc_add(self, func, slc_def=None):
+    def _slc_add(self, func, flags=None, value=None):
         """ buffer slc triplet response as (function, flag, value),
-            for the given SLC_func byte and slc_def instance providing
-            byte attributes ``flag`` and ``val``. If no slc_def is provided,
-            the slc definition of ``_slctab`` is used by key ``func``.
+            for the given integer SLC function ``func``, ``flags``, and
+            ``value``. If no flags are provided, the slc definition of
+            ``_slctab`` is used by key ``func``.
         """
+        if self._slc_buffer is None:
+            self._slc_buffer = bytearray()
         assert len(self._slc_buffer) < self.SLC_MAXSIZE, ('SLC: buffer full')
-        if slc_def is None:
-            slc_def = self._slctab[func]
+        if flags is None:
+            flags, value = self._slctab.flags[func], self._slctab.values[func]
         self.log.debug('_slc_add (%s, %s)',
-            name_slc_command(func), slc_def)
-        self._slc_buffer.extend([func, slc_def.mask, slc_def.val])
+            name_slc_command(func), describe_slc(flags, value))
+        self._slc_buffer.extend((func, flags, value))
 
-    def _slc_process(self, func, slc_def):
-        """ Process an SLC definition provided by remote end.
+    def _slc_process(self, func, flags, value):
+        """ Process an SLC definition provided by remote end, as integer
+            function ``func``, ``flags``, and ``value``.
 
             Ensure the function definition is in-bounds and an SLC option
             we support. Store SLC_VARIABLE changes to self._slctab, keyed
-            by SLC byte function ``func``.
+            by SLC function ``func``.
 
             The special definition (0, SLC_DEFAULT|SLC_VARIABLE, 0) has the
             side-effect of replying with a full slc tabset, resetting to
             the default tabset, if indicated.  """
-        self.log.debug('_slc_process %s mine=%s, his=%s',
-                name_slc_command(func), self._slctab[func], slc_def)
-
         # out of bounds checking
-        if ord(func) > NSLC:
+        if func > NSLC:
             self.log.warn('SLC not supported (out of range): (%r)', func)
-            self._slc_add(func, SLC_nosupport())
+            self._slc_add(func, LEVEL_NOSUPPORT, ord(_POSIX_VDISABLE))
             return
 
+        slctab = self._slctab
+        self.log.debug('_slc_process %s mine=%s, his=%s',
+                name_slc_command(func),
+                describe_slc(slctab.flags[func], slctab.values[func]),
+                describe_slc(flags, value))
+
         # process special request
-        if func == theNULL:
-            if slc_def.level == SLC_DEFAULT:
+        hislevel = flags & SLC_LEVELBITS
+        if func == 0:
+            if hislevel == LEVEL_DEFAULT:
                 # client requests we send our default tab,
                 self.log.info('SLC_DEFAULT')
                 self._default_slc(self._default_tabset)
                 self._slc_send()
-            elif slc_def.level == SLC_VARIABLE:
+            elif hislevel == LEVEL_VARIABLE:
                 # client requests we send our current tab,
                 self.log.info('SLC_VARIABLE')
                 self._slc_send()
             else:
-                self.log.warn('func(0) flag expected, got %s.', slc_def)
+                self.log.warn('func(0) flag expected, got %s.',
+                        describe_slc(flags, value))
             return
 
         # evaluate slc
-        mylevel, myvalue = (self._slctab[func].level, self._slctab[func].val)
-        if slc_def.level == mylevel and myvalue == slc_def.val:
+        mylevel, myvalue = slctab.level(func), slctab.values[func]
+        if hislevel == mylevel and myvalue == value:
             return
-        elif slc_def.level == mylevel and slc_def.ack:
+        elif hislevel == mylevel and flags & FLAG_ACK:
             return
-        elif slc_def.ack:
+        elif flags & FLAG_ACK:
             self.log.debug('slc value mismatch with ack bit set: (%r,%r)',
-                    myvalue, slc_def.val)
+                    myvalue, value)
             return
         else:
-            self._slc_change(func, slc_def)
+            self._slc_change(func, flags, value)
+            self._update_forwardmask(myvalue, self._slctab.values[func])
 
-    def _slc_change(self, func, slc_def):
+    def _slc_change(self, func, flags, value):
         """ Update SLC tabset with SLC definition provided by remote end.
 
             Modify prviate attribute ``_slctab`` appropriately for the level
@@ -1421,60 +1975,55 @@ class TelnetStreamReader:
 
             Reply as appropriate ..
         """
-        hislevel, hisvalue = slc_def.level, slc_def.val
-        mylevel, myvalue = self._slctab[func].level, self._slctab[func].val
-        if hislevel == SLC_NOSUPPORT:
+        slctab = self._slc_writable()
+        default = _shared_slctab(DEFAULT_SLC_TAB)
+        hislevel = flags & SLC_LEVELBITS
+        mylevel = slctab.level(func)
+        if hislevel == LEVEL_NOSUPPORT:
             # client end reports SLC_NOSUPPORT; use a
             # nosupport definition with ack bit set
-            self._slctab[func] = SLC_nosupport()
-            self._slctab[func].set_flag(SLC_ACK)
+            slctab.set(func, LEVEL_NOSUPPORT | FLAG_ACK, ord(_POSIX_VDISABLE))
             self._slc_add(func)
             return
 
-        if hislevel == SLC_DEFAULT:
+        if hislevel == LEVEL_DEFAULT:
             # client end requests we use our default level
-            if mylevel == SLC_DEFAULT:
+            if mylevel == LEVEL_DEFAULT:
                 # client end telling us to use SLC_DEFAULT on an SLC we do not
                 # support (such as SYNCH). Set flag to SLC_NOSUPPORT instead
                 # of the SLC_DEFAULT value that it begins with
-                self._slctab[func].set_mask(SLC_NOSUPPORT)
+                slctab.flags[func] = LEVEL_NOSUPPORT
             else:
                 # set current flag to the flag indicated in default tab
-                self._slctab[func].set_mask(DEFAULT_SLC_TAB.get(func).mask)
+                slctab.flags[func] = default.flags[func]
             # set current value to value indicated in default tab
-            self._slctab[func].set_value(DEFAULT_SLC_TAB.get(func,
-                SLC_nosupport()).val)
+            slctab.values[func] = default.values[func]
             self._slc_add(func)
             return
 
         # client wants to change to a new value, or,
         # refuses to change to our value, accept their value.
-        if self._slctab[func].val != theNULL:
-            self._slctab[func].set_value(slc_def.val)
-            self._slctab[func].set_mask(slc_def.mask)
-            slc_def.set_flag(SLC_ACK)
-            self._slc_add(func, slc_def)
+        if slctab.values[func] != 0:
+            slctab.set(func, flags, value)
+            self._slc_add(func, flags | FLAG_ACK, value)
             return
 
         # if our byte value is b'\x00', it is not possible for us to support
         # this request. If our level is default, just ack whatever was sent.
         # it is a value we cannot change.
-        if mylevel == SLC_DEFAULT:
+        if mylevel == LEVEL_DEFAULT:
             # If our level is default, store & ack whatever was sent
-            self._slctab[func].set_mask(slc_def.mask)
-            self._slctab[func].set_value(slc_def.val)
-            slc_def.set_flag(SLC_ACK)
-            self._slc_add(func, slc_def)
-        elif slc_def.level == SLC_CANTCHANGE and mylevel == SLC_CANTCHANGE:
+            slctab.set(func, flags, value)
+            self._slc_add(func, flags | FLAG_ACK, value)
+        elif hislevel == LEVEL_CANTCHANGE and mylevel == LEVEL_CANTCHANGE:
             # "degenerate to SLC_NOSUPPORT"
-            self._slctab[func].set_mask(SLC_NOSUPPORT)
+            slctab.flags[func] = LEVEL_NOSUPPORT
             self._slc_add(func)
         else:
             # mask current level to levelbits (clears ack),
-            self._slctab[func].set_mask(self._slctab[func].level)
-            if mylevel == SLC_CANTCHANGE:
-                self._slctab[func].val = DEFAULT_SLC_TAB.get(
-                        func, SLC_nosupport()).val
+            slctab.flags[func] = mylevel
+            if mylevel == LEVEL_CANTCHANGE:
+                slctab.values[func] = default.values[func]
             self._slc_add(func)
 
     def _generate_forwardmask(self):
@@ -1495,26 +2044,30 @@ class TelnetStreamReader:
         #
         #       if b'\x03' in stream.linemode_forwardmask:
         #           stream.write(b'Press ^C to exit.\r\n')
-        if not self.local_option.enabled(BINARY):
-            num_bytes, msb = 16, 127
-        else:
-            num_bytes, msb = 32, 256
-        mask32 = [theNULL] * num_bytes
-        for mask in range(msb // 8):
-            start = mask * 8
-            last = start + 7
-            byte = theNULL
-            for char in range(start, last + 1):
-                (func, slc_name, slc_def) = self._slc_snoop(bytes([char]))
-                if func is not None and not slc_def.nosupport:
-                    # set bit for this character, it is a supported slc char
-                    byte = bytes([ord(byte) | 1])
-                if char != last:
-                    # shift byte left for next character,
-                    # except for the final byte.
-                    byte = bytes([ord(byte) << 1])
-            mask32[mask] = byte
-        return Forwardmask(b''.join(mask32), ack=self._forwardmask_enabled)
+        if self._forwardmask is None:
+            self._forwardmask = bytearray(32)
+            self._update_forwardmask(*set(self._slctab.values))
+        num_bytes = 32 if self.local_option.enabled(BINARY) else 16
+        return Forwardmask(bytes(self._forwardmask[:num_bytes]),
+                           ack=self._forwardmask_enabled)
+
+    def _update_forwardmask(self, *chars):
+        """ Update bits of keyboard ascii values ``chars`` in the
+            bitmask ``_forwardmask``, if generated, to reflect whether the
+            first SLC function of that value in the SLC tab is supported.
+        """
+        fmask = self._forwardmask
+        if fmask is None:
+            return
+        for char in chars:
+            func = self._slctab.find(char)
+            bit = 0x80 >> (char % 8)
+            if (func != -1 and not self._slctab.nosupport(func)
+                    and self._slc_func(bytes([func])) is not None):
+                # set bit for this character, it is a supported slc char
+                fmask[char // 8] |= bit
+            else:
+                fmask[char // 8] &= ~bit
 
 # Class constructor / set-default routines
 #
@@ -1546,25 +2099,47 @@ class TelnetStreamReader:
         self.set_default_linemode()
 
     def _default_callbacks(self):
-        """ Set default callback dictionaries ``_iac_callback``,
-            ``_slc_callback``, and ``_ext_callback`` to default methods of
-            matching names, such that IAC + IP, or, the SLC value negotiated
-            for SLC_IP, signals a callback to method ``self.handle_ip``.
+        """ Reset callback dictionaries ``_iac_callback``, ``_slc_callback``,
+            and ``_ext_callback`` to None, such that IAC + IP, or, the SLC
+            value negotiated for SLC_IP, signals a callback to method of
+            matching name, ``self.handle_ip``.
+
+            The default methods are named by class attributes, shared by
+            all instances; only callbacks registered by the methods
+            beginning with ``set_callback`` are stored per-instance.
         """
-        self._iac_callback = {}
-        for iac_cmd, key in DEFAULT_IAC_CALLBACKS:
-            self.set_iac_callback(iac_cmd, getattr(self, 'handle_%s' % (key,)))
-
-        self._slc_callback = {}
-        for slc_cmd, key in DEFAULT_SLC_CALLBACKS:
-            self.set_slc_callback(slc_cmd, getattr(self, 'handle_%s' % (key,)))
-
+        self._iac_callback = None
+        self._slc_callback = None
         # extended callbacks may receive various arguments
-        self._ext_callback = {}
-        for ext_cmd, key in DEFAULT_EXT_CALLBACKS:
-            self.set_ext_callback(ext_cmd, getattr(self, 'handle_%s' % (key,)))
+        self._ext_callback = None
+
+    def _lookup_callback(self, callbacks, defaults, key):
+        """ Returns callback registered in dictionary ``callbacks`` for
+            ``key``, otherwise the method named by ``defaults``, or None.
+        """
+        if callbacks is not None and key in callbacks:
+            return callbacks[key]
+        name = defaults.get(key, None)
+        return getattr(self, name) if name is not None else None
+
+    def _iac_func(self, cmd):
+        """ Returns callback for IAC command ``cmd``. """
+        return self._lookup_callback(
+                self._iac_callback, self._default_iac_callback, cmd)
+
+    def _slc_func(self, slc):
+        """ Returns callback for SLC function ``slc``, or None. """
+        return self._lookup_callback(
+                self._slc_callback, self._default_slc_callback, slc)
+
+    def _ext_func(self, cmd):
+        """ Returns callback for subnegotiation result of ``cmd``. """
+        return self._lookup_callback(
+                self._ext_callback, self._default_ext_callback, cmd)
 
 class Linemode(object):
+    __slots__ = ('mask',)
+
     def __init__(self, mask=LMODE_MODE_LOCAL):
         """ A mask of ``LMODE_MODE_LOCAL`` means that all line editing is
             performed on the client side (default). A mask of theNULL (\x00)
@@ -1679,6 +2254,96 @@ _DEBUG_OPTS = dict([(value, key)
                       'GA', 'SB', 'EOF', 'SUSP', 'ABORT', 'LOGOUT',
                       'CHARSET', 'SNDLOC')])
 
+#: NEW_ENVIRON requests encoded by ``_encode_env_request()``, keyed by names
+_ENV_REQUESTS = {}
+
+def _encode_env_request(names):
+    """ Returns IAC SB NEW_ENVIRON SEND IS sub-negotiation requesting the
+        tuple of variable ``names``, encoded once for each distinct tuple.
+    """
+    if names not in _ENV_REQUESTS:
+        _ENV_REQUESTS[names] = b''.join([
+            IAC, SB, NEW_ENVIRON, SEND, IS,
+            theNULL.join(bytes(name, 'ascii') for name in names),
+            b'\x03', IAC, SE])
+    return _ENV_REQUESTS[names]
+
+#: CHARSET requests encoded by ``_encode_charset_request()``, keyed by
+#  (codepages, sep)
+_CHARSET_REQUESTS = {}
+
+def _encode_charset_request(codepages, sep):
+    """ Returns IAC SB CHARSET REQUEST sub-negotiation offering the tuple
+        of charset names ``codepages``, each preceded by separator ``sep``,
+        encoded once for each distinct tuple.
+    """
+    if (codepages, sep) not in _CHARSET_REQUESTS:
+        _CHARSET_REQUESTS[(codepages, sep)] = b''.join([
+            IAC, SB, CHARSET, CHARSET_REQUEST,
+            bytes(''.join(sep + name for name in codepages), 'ascii'),
+            IAC, SE])
+    return _CHARSET_REQUESTS[(codepages, sep)]
+
+#: patterns of ``inband_run()``, keyed by SLC values excluded.
+_INBAND_PATTERNS = {}
+
+def _inband_pattern(slc_values):
+    """ Returns compiled pattern matching printable 7-bit ascii, except
+        any of bytes ``slc_values``.
+    """
+    pattern = _INBAND_PATTERNS.get(slc_values)
+    if pattern is None:
+        pattern = _INBAND_PATTERNS[slc_values] = re.compile(b''.join(
+            [b'['] + [re.escape(bytes([value])) for value in range(32, 127)
+                      if value not in slc_values] + [b']+']))
+    return pattern
+
+def _is_control(data):
+    """ Returns True if IAC command ``data`` is of option negotiation,
+        that may be sent ahead of queued output: DO and DONT, WILL and WONT
+        of any option but TM, replied at its position in output, and
+        BINARY, that changes how output following it is received, and
+        sub-negotiation of any option but CHARSET, whose ACCEPTED reply
+        likewise changes the encoding of output following it.
+    """
+    cmd, opt = data[1:2], data[2:3]
+    return (cmd in (DO, DONT)
+            or cmd in (WILL, WONT) and opt not in (TM, BINARY)
+            or cmd == SB and opt != CHARSET)
+
+#: IAC command option plans compiled by ``_compile_plan()``, keyed by plan.
+_PLANS = {}
+
+def _compile_plan(plan):
+    """ Returns tuple (encoded, pending, descr) for ``plan``, a tuple of
+        (cmd, opt) pairs: the bytes of each IAC command in sequence, the
+        ``pending_option`` keys of each DO and WILL request, and a string
+        describing them for debug logging.
+    """
+    if plan not in _PLANS:
+        for cmd, opt in plan:
+            assert cmd in (DO, DONT, WILL, WONT), (
+                    'Uknown IAC {}.'.format(_name_command(cmd)))
+        _PLANS[plan] = (
+                b''.join(IAC + cmd + opt for cmd, opt in plan),
+                tuple(cmd + opt for cmd, opt in plan if cmd in (DO, WILL)),
+                ', '.join('IAC {} {}'.format(_name_command(cmd),
+                                            _name_command(opt))
+                          for cmd, opt in plan))
+    return _PLANS[plan]
+
+#: SLC tabs shared by streams until modified, keyed by ``id`` of tabset,
+#  valued by the tuple (tabset, slctab), so that the key remains unique.
+_SHARED_SLCTABS = {}
+
+def _shared_slctab(tabset):
+    """ Returns SLC tab of every SLC function for ``tabset``, shared by all
+        streams that have not modified it; it must not be modified.
+    """
+    if id(tabset) not in _SHARED_SLCTABS:
+        _SHARED_SLCTABS[id(tabset)] = (tabset, SLC_tab(tabset))
+    return _SHARED_SLCTABS[id(tabset)][1]
+
 def _name_command(byte):
     """ Given an IAC byte, return its mnumonic global constant. """
     return (repr(byte) if byte not in _DEBUG_OPTS
@@ -0,0 +1,142 @@
+"""
+Stream interface to a TelnetServer session, for session handlers written
+as a single coroutine, ``shell(reader, writer)``::
+
+    @telstream.coroutine
+    def shell(reader, writer):
+        writer.write('\\r\\nname? ')
+        name = yield from reader.readline()
+        writer.write('hello, {}!\\r\\n'.format(name.strip()))
+        yield from writer.drain()
+
+    TelnetServer(shell=shell)
+
+The handler is started once negotiation completes, in place of the first
+prompt, and the connection is closed when it returns.
+"""
+import types
+
+try:
+    import asyncio
+except ImportError:
+    import tulip as asyncio
+
+__all__ = ['TelnetReader', 'TelnetWriter', 'coroutine']
+
+#: decorator for generator-based coroutines, which may also be awaited
+#  by ``await`` (asyncio of python 3.11 and later no longer provides it).
+coroutine = getattr(asyncio, 'coroutine', None) or types.coroutine
+
+
+class TelnetReader(object):
+    """
+        Reads input of TelnetServer ``server``: in-band data received after
+        interpretation of any IAC commands, decoded using the session's
+        preferred encoding. Lines end with CR LF ('\\r\\n'), or CR NUL,
+        which is received as CR LF.
+
+        Reading from the transport is paused while more than twice ``limit``
+        bytes are buffered, until no more than ``limit`` bytes remain.
+    """
+    def __init__(self, server, limit=2 ** 16):
+        self._server = server
+        self.limit = limit
+        #: ``asyncio.StreamReader`` of in-band bytes
+        self._reader = asyncio.StreamReader(limit=limit)
+        #: number of bytes fed and not yet read
+        self._buffered = 0
+        #: True when reading from transport is paused
+        self._paused = False
+
+    def feed_data(self, data):
+        """ Buffer in-band bytes ``data`` received by session. """
+        self._reader.feed_data(data)
+        self._buffered += len(data)
+        transport = self._server.transport
+        if (not self._paused and self._buffered > 2 * self.limit
+                and hasattr(transport, 'pause_reading')):
+            self._paused = True
+            transport.pause_reading()
+
+    def feed_eof(self):
+        """ Signal end of input, the connection was closed. """
+        self._reader.feed_eof()
+
+    def at_eof(self):
+        """ Returns True if buffer is empty and end of input was fed. """
+        return self._reader.at_eof()
+
+    @coroutine
+    def readline(self):
+        """ .. method::readline() -> str
+
+            Returns next line of input, including its CR LF, or less
+            when end of input is reached.
+        """
+        data = yield from self._reader.readline()
+        return self._consumed(data)
+
+    @coroutine
+    def read(self, n=-1):
+        """ .. method::read(n : int) -> str
+
+            Returns up to ``n`` bytes of input, decoded, or all input until
+            end of input when ``n`` is -1. Multibyte characters split by
+            ``n`` are returned by the next read.
+        """
+        data = yield from self._reader.read(n)
+        return self._consumed(data)
+
+    def _consumed(self, data):
+        """ Returns bytes ``data`` read from buffer, decoded, resuming
+            reading from transport if paused and buffer has drained.
+        """
+        self._buffered -= len(data)
+        if self._paused and self._buffered <= self.limit:
+            self._paused = False
+            self._server.transport.resume_reading()
+        return self._server.decode(data, final=self._reader.at_eof())
+
+
+class TelnetWriter(object):
+    """
+        Writes output of TelnetServer ``server``, encoded using the session's
+        preferred encoding. Writes are buffered by the transport; ``drain()``
+        waits until the transport buffer has flushed below its high-water
+        mark, so that a fast writer is slowed to the pace of its client.
+    """
+    def __init__(self, server):
+        self._server = server
+
+    @property
+    def transport(self):
+        return self._server.transport
+
+    def write(self, ucs):
+        """ Write unicode string ``ucs``. """
+        self._server.echo(ucs)
+
+    def writelines(self, lines):
+        """ Write each unicode string of iterable ``lines``. """
+        for ucs in lines:
+            self._server.echo(ucs)
+
+    def get_extra_info(self, name, default=None):
+        return self._server.transport.get_extra_info(name, default)
+
+    def close(self):
+        """ Close connection. """
+        self._server.transport.close()
+
+    @coroutine
+    def drain(self):
+        """ .. method::drain()
+
+            Wait until writing to transport is resumed, if paused.
+            Raises ConnectionResetError if the connection was lost.
+        """
+        waiter = self._server.drain_waiter()
+        if waiter is not None:
+            yield from waiter
+        if self._server.is_closing:
+            raise ConnectionResetError('Connection lost')
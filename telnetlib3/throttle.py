@@ -0,0 +1,111 @@
+import collections
+import time
+
+__all__ = ['TokenBucket', 'CommandQuota']
+
+
+class TokenBucket(object):
+    """
+        Limits the input rate of a session to ``rate`` bytes per second,
+        allowing bursts of up to ``burst`` bytes, by default one second
+        of input.
+
+        Input already received is always consumed, leaving the bucket in
+        debt, and the caller is expected to stop reading for ``delay``
+        seconds, such as by ``transport.pause_reading()``.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', '_stamp')
+
+    def __init__(self, rate, burst=None):
+        assert rate > 0, rate
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        #: bytes that may be received without delay, negative when in debt
+        self.tokens = self.burst
+        self._stamp = time.monotonic()
+
+    def consume(self, num):
+        """ .. method::consume(num : int) -> bool
+
+            Take ``num`` bytes received from bucket, returning False if
+            the bucket is in debt.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        self.tokens -= num
+        return self.tokens >= 0
+
+    @property
+    def delay(self):
+        """ Seconds until the bucket is no longer in debt. """
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class CommandQuota(object):
+    """
+        Limits the number of commands processed by all sessions in a single
+        iteration of the event loop to ``per_tick``, and by any one session
+        to ``per_session``, so that a client pasting, or a bot flooding,
+        hundreds of lines does not stall every other session while they
+        are processed. A single instance is shared by all sessions of a
+        server.
+
+        A session denied by ``acquire()`` queues its input lines and calls
+        ``defer()``. Deferred sessions are resumed in the order they were
+        deferred, at the start of the next iteration.
+    """
+    def __init__(self, per_tick=64, per_session=4):
+        self.per_tick = per_tick
+        self.per_session = per_session
+        #: count of commands 'run' and 'deferred'
+        self.stats = collections.Counter()
+        #: commands run in this iteration, in total and keyed by session
+        self._used = 0
+        self._sessions = collections.Counter()
+        #: callbacks of sessions deferred to the next iteration
+        self._waiting = collections.deque()
+        #: handle of ``_next_tick()`` scheduled by first use in iteration
+        self._handle = None
+
+    def acquire(self, loop, session):
+        """ .. method::acquire(loop, session) -> bool
+
+            Returns True if ``session`` may process a command in this
+            iteration of event loop ``loop``.
+        """
+        if self._handle is None:
+            self._handle = loop.call_soon(self._next_tick)
+        if (self._used >= self.per_tick
+                or self._sessions[session] >= self.per_session):
+            self.stats['deferred'] += 1
+            return False
+        self._used += 1
+        self._sessions[session] += 1
+        self.stats['run'] += 1
+        return True
+
+    def defer(self, loop, callback):
+        """ .. method::defer(loop, callback : callable)
+
+            Call ``callback`` at the start of the next iteration of event
+            loop ``loop``, after any sessions deferred before it.
+        """
+        if self._handle is None:
+            self._handle = loop.call_soon(self._next_tick)
+        self._waiting.append(callback)
+
+    def _next_tick(self):
+        self._handle = None
+        self._used = 0
+        self._sessions.clear()
+        waiting, self._waiting = self._waiting, collections.deque()
+        for callback in waiting:
+            callback()
+
+    def __str__(self):
+        """ Returns string describing command quota state. """
+        return '{} per tick, {} per session, {} run, {} deferred'.format(
+            self.per_tick, self.per_session, self.stats['run'],
+            self.stats['deferred'])
@@ -0,0 +1,74 @@
+import collections
+import bisect
+
+__all__ = ['RoundTripStats']
+
+
+class RoundTripStats(object):
+    """
+        Round-trip times measured by each session, by sending IAC DO TM
+        (TIMING-MARK) and receiving its reply, WILL or WONT TM. A single
+        instance is shared by all sessions of a server.
+
+        Each sample is counted in a histogram of ``BOUNDS``, and the smoothed
+        round-trip time and jitter of each user, keyed by 'user@address', is
+        kept in an ``collections.OrderedDict`` of the ``maxusers`` most
+        recently measured.
+    """
+    #: upper bound of each histogram bucket, in seconds; the last bucket
+    #  counts samples greater than all bounds.
+    BOUNDS = (0.001, 0.002, 0.005, 0.010, 0.020, 0.050,
+              0.100, 0.200, 0.500, 1.000, 2.000, 5.000, )
+
+    def __init__(self, maxusers=4096):
+        self.maxusers = maxusers
+        #: count of samples, by bucket of ``BOUNDS``
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        #: count of timing-marks 'sent', 'received', and 'lost', not
+        #  answered before the next was due.
+        self.stats = collections.Counter()
+        #: tuple (srtt, jitter), keyed by 'user@address'
+        self.users = collections.OrderedDict()
+
+    def record(self, user, rtt, srtt, jitter):
+        """ .. method::record(user : str, rtt : float, srtt : float,
+                              jitter : float)
+
+            Count sample ``rtt``, and store smoothed round-trip time
+            ``srtt`` and ``jitter`` of ``user``, in seconds.
+        """
+        self.stats['received'] += 1
+        self.counts[bisect.bisect_left(self.BOUNDS, rtt)] += 1
+        self.users[user] = (srtt, jitter)
+        self.users.move_to_end(user)
+        while len(self.users) > self.maxusers:
+            self.users.popitem(last=False)
+
+    def percentile(self, pct):
+        """ .. method::percentile(pct : float) -> float
+
+            Returns upper bound of the bucket containing percentile ``pct``
+            (0 to 100) of all samples, or None if there are none, or it is
+            greater than all ``BOUNDS``.
+        """
+        total = sum(self.counts)
+        if not total:
+            return None
+        rank, seen = total * pct / 100.0, 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def __str__(self):
+        """ Returns string describing round-trip times of all sessions. """
+        def fmt(pct):
+            bound = self.percentile(pct)
+            return ('<{:0.0f}ms'.format(bound * 1000) if bound is not None
+                    else '>{:0.0f}ms'.format(self.BOUNDS[-1] * 1000))
+        if not self.stats['received']:
+            return '{} sent, 0 received'.format(self.stats['sent'])
+        return '{} received, 50% {}, 90% {}, 99% {}, {} lost'.format(
+            self.stats['received'], fmt(50), fmt(90), fmt(99),
+            self.stats['lost'])
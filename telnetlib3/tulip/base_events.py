@@ -463,7 +463,7 @@ class BaseEventLoop(events.AbstractEventLoop):
         for sock in sockets:
             sock.listen(backlog)
             sock.setblocking(False)
-            self._start_serving(protocol_factory, sock, ssl)
+            self._start_serving(protocol_factory, sock, ssl, backlog)
         return sockets
 
     @tasks.coroutine
@@ -201,7 +201,7 @@ class BaseProactorEventLoop(base_events.BaseEventLoop):
     def _write_to_self(self):
         self._csock.send(b'x')
 
-    def _start_serving(self, protocol_factory, sock, ssl=None):
+    def _start_serving(self, protocol_factory, sock, ssl=None, backlog=100):
         assert not ssl, 'IocpEventLoop imcompatible with SSL.'
 
         def loop(f=None):
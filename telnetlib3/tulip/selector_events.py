@@ -33,6 +33,12 @@ from .log import tulip_log
 #                            ))
 
 
+def _same_handle(handle, callback, args):
+    """Return True if ``handle`` is an active Handle for callback(*args)."""
+    return (handle is not None and not handle._cancelled
+            and handle._callback == callback and handle._args == args)
+
+
 class BaseSelectorEventLoop(base_events.BaseEventLoop):
     """Selector event loop.
 
@@ -98,42 +104,50 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
         except (BlockingIOError, InterruptedError):
             pass
 
-    def _start_serving(self, protocol_factory, sock, ssl=None):
+    def _start_serving(self, protocol_factory, sock, ssl=None, backlog=100):
         self.add_reader(sock.fileno(), self._accept_connection,
-                        protocol_factory, sock, ssl)
+                        protocol_factory, sock, ssl, backlog)
 
-    def _accept_connection(self, protocol_factory, sock, ssl=None):
-        try:
-            conn, addr = sock.accept()
-            conn.setblocking(False)
-        except (BlockingIOError, InterruptedError):
-            pass  # False alarm.
-        except Exception:
-            # Bad error. Stop serving.
-            self.remove_reader(sock.fileno())
-            sock.close()
-            # There's nowhere to send the error, so just log it.
-            # TODO: Someone will want an error handler for this.
-            tulip_log.exception('Accept failed')
-        else:
-            if ssl:
-                self._make_ssl_transport(
-                    conn, protocol_factory(), ssl, None,
-                    server_side=True, extra={'addr': addr})
+    def _accept_connection(self, protocol_factory, sock, ssl=None,
+                           backlog=100):
+        # Accept up to ``backlog`` connections for each readable event, so
+        # that a burst of connections is accepted in a single iteration.
+        for _ in range(backlog):
+            try:
+                conn, addr = sock.accept()
+                conn.setblocking(False)
+            except (BlockingIOError, InterruptedError):
+                return  # False alarm, or the backlog is drained.
+            except Exception:
+                # Bad error. Stop serving.
+                self.remove_reader(sock.fileno())
+                sock.close()
+                # There's nowhere to send the error, so just log it.
+                # TODO: Someone will want an error handler for this.
+                tulip_log.exception('Accept failed')
+                return
             else:
-                self._make_socket_transport(
-                    conn, protocol_factory(), extra={'addr': addr})
-        # It's now up to the protocol to handle the connection.
+                if ssl:
+                    self._make_ssl_transport(
+                        conn, protocol_factory(), ssl, None,
+                        server_side=True, extra={'addr': addr})
+                else:
+                    self._make_socket_transport(
+                        conn, protocol_factory(), extra={'addr': addr})
+            # It's now up to the protocol to handle the connection.
 
     def add_reader(self, fd, callback, *args):
         """Add a reader callback."""
-        handle = events.make_handle(callback, args)
         try:
             mask, (reader, writer) = self._selector.get_info(fd)
         except KeyError:
+            handle = events.make_handle(callback, args)
             self._selector.register(fd, selectors.EVENT_READ,
                                     (handle, None))
         else:
+            if _same_handle(reader, callback, args):
+                return  # already registered, re-use existing Handle.
+            handle = events.make_handle(callback, args)
             self._selector.modify(fd, mask | selectors.EVENT_READ,
                                   (handle, writer))
             if reader is not None:
@@ -160,13 +174,16 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
 
     def add_writer(self, fd, callback, *args):
         """Add a writer callback.."""
-        handle = events.make_handle(callback, args)
         try:
             mask, (reader, writer) = self._selector.get_info(fd)
         except KeyError:
+            handle = events.make_handle(callback, args)
             self._selector.register(fd, selectors.EVENT_WRITE,
                                     (None, handle))
         else:
+            if _same_handle(writer, callback, args):
+                return  # already registered, re-use existing Handle.
+            handle = events.make_handle(callback, args)
             self._selector.modify(fd, mask | selectors.EVENT_WRITE,
                                   (reader, handle))
             if writer is not None:
@@ -308,17 +325,21 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
             fut.set_exception(exc)
 
     def _process_events(self, event_list):
+        # Reader and writer handles are never TimerHandles, so the whole
+        # batch is appended to the ready queue directly, without the
+        # per-event checks of _add_callback().
+        ready_append = self._ready.append
         for fileobj, mask, (reader, writer) in event_list:
             if mask & selectors.EVENT_READ and reader is not None:
                 if reader._cancelled:
                     self.remove_reader(fileobj)
                 else:
-                    self._add_callback(reader)
+                    ready_append(reader)
             if mask & selectors.EVENT_WRITE and writer is not None:
                 if writer._cancelled:
                     self.remove_writer(fileobj)
                 else:
-                    self._add_callback(writer)
+                    ready_append(writer)
 
     def stop_serving(self, sock):
         self.remove_reader(sock.fileno())
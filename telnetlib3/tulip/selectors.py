@@ -310,18 +310,23 @@ if 'epoll' in globals():
         def __init__(self):
             super().__init__()
             self._epoll = epoll()
+            # list of ready (fileobj, events, data), re-used by each select()
+            self._ready = []
 
         def fileno(self):
             return self._epoll.fileno()
 
-        def register(self, fileobj, events, data=None):
-            key = super().register(fileobj, events, data)
+        def _epoll_events(self, events):
             epoll_events = 0
             if events & EVENT_READ:
                 epoll_events |= EPOLLIN
             if events & EVENT_WRITE:
                 epoll_events |= EPOLLOUT
-            self._epoll.register(key.fd, epoll_events)
+            return epoll_events
+
+        def register(self, fileobj, events, data=None):
+            key = super().register(fileobj, events, data)
+            self._epoll.register(key.fd, self._epoll_events(events))
             return key
 
         def unregister(self, fileobj):
@@ -329,25 +334,47 @@ if 'epoll' in globals():
             self._epoll.unregister(key.fd)
             return key
 
+        def modify(self, fileobj, events, data=None):
+            # Modify the key in-place: a change of events is a single
+            # epoll_ctl(EPOLL_CTL_MOD), a change of only data is free.
+            try:
+                key = self._fileobj_to_key[fileobj]
+            except KeyError:
+                raise ValueError("{!r} is not registered".format(fileobj))
+            if (not events) or (events & ~(EVENT_READ|EVENT_WRITE)):
+                raise ValueError("Invalid events: {}".format(events))
+            if events != key.events:
+                self._epoll.modify(key.fd, self._epoll_events(events))
+                key.events = events
+            key.data = data
+            return key
+
         def select(self, timeout=None):
+            # The returned list is re-used, and is only valid until the
+            # next call to select().
             timeout = -1 if timeout is None else timeout
-            max_ev = self.registered_count()
-            ready = []
+            # size maxevents to the number of registered file descriptors,
+            # so a single epoll_wait() returns every ready file descriptor.
+            max_ev = max(len(self._fd_to_key), 1)
+            ready = self._ready
+            ready.clear()
             try:
                 fd_event_list = self._epoll.poll(timeout, max_ev)
             except InterruptedError:
                 # A signal arrived.  Don't die, just return no events.
-                return []
+                return ready
+            fd_to_key = self._fd_to_key
             for fd, event in fd_event_list:
+                key = fd_to_key.get(fd)
+                if key is None:
+                    tulip_log.warning('No key found for fd %r', fd)
+                    continue
                 events = 0
                 if event & ~EPOLLIN:
                     events |= EVENT_WRITE
                 if event & ~EPOLLOUT:
                     events |= EVENT_READ
-
-                key = self._key_from_fd(fd)
-                if key:
-                    ready.append((key.fileobj, events & key.events, key.data))
+                ready.append((key.fileobj, events & key.events, key.data))
             return ready
 
         def close(self):
@@ -416,10 +443,10 @@ if 'kqueue' in globals():
 
 # Choose the best implementation: roughly, epoll|kqueue > poll > select.
 # select() also can't accept a FD > FD_SETSIZE (usually around 1024)
-if 'KqueueSelector' in globals():
-    DefaultSelector = KqueueSelector
-elif 'EpollSelector' in globals():
+if 'EpollSelector' in globals():
     DefaultSelector = EpollSelector
+elif 'KqueueSelector' in globals():
+    DefaultSelector = KqueueSelector
 elif 'PollSelector' in globals():
     DefaultSelector = PollSelector
 else: